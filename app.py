@@ -1,14 +1,25 @@
-from fasthtml.common import *
+from boot import boot_phase, mark_imported, finish_boot, get_boot_stats
+with boot_phase('fasthtml'):
+    from fasthtml.common import *
 import os
-import bcrypt
-import jwt
-from datetime import datetime, timedelta
-from pathlib import Path
-import mimetypes
-from starlette.responses import FileResponse
+import json
+import asyncio
+import html
+from urllib.parse import urlencode, quote
+from starlette.routing import Route
 from dotenv import load_dotenv
-from database import init_db, signup_user, signin_user, get_user_profile, get_profile_by_email, get_profile_by_student_code, save_document, get_user_documents, delete_document, reset_password_email
-from supabase import create_client
+from cache import TTLCache
+# Supabase SDK modules are imported by database.py on first client use
+with boot_phase('app modules'):
+    from database import init_db, close_clients, signup_user, signin_user, get_user_profile, get_profile_by_email, get_profile_by_student_code, save_document, save_documents, list_user_documents, search_user_documents, decode_cursor, get_document, get_documents, delete_document, delete_documents, reset_password_email, update_user_password, get_public_url, create_signed_urls, remove_files, remove_unreferenced_files, update_document_file, probe_file, find_documents_by_hash, get_cache_stats, get_client_stats
+    from uploads import stream_upload, stream_batch_upload, UploadRejected, create_upload_session, get_upload_session, upload_progress, write_chunk, finalize_upload_session, discard_upload_session, create_direct_upload, verify_direct_upload, UPLOAD_CONCURRENCY, maybe_sweep_upload_sessions, run_upload_sweeper
+    from auth import verify_access_token, forget_access_token, get_auth_stats, set_session_cookies, TokenRefreshMiddleware, RequestAuthMiddleware
+    from downloads import stream_download
+    from compression import CompressionMiddleware, get_compression_stats
+    from shells import static_shell, serve_shell, get_shell_stats, APP_VERSION
+    from static_files import asset_url, serve_static, get_static_stats
+    from extraction import enqueue_extraction, start_extraction_workers, stop_extraction_workers, get_extraction_stats
+    from warmup import start_warmup, stop_warmup, retry_warmup, is_ready, get_warmup_stats
 
 # Load environment variables
 load_dotenv()
@@ -16,84 +27,87 @@ load_dotenv()
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "tu-clave-secreta-muy-segura-cambiala")
 
-# Allowed file extensions
-ALLOWED_EXTENSIONS = {'.pdf', '.docx', '.doc', '.xlsx', '.xls'}
+# Download mode: 'signed' links straight to short-lived signed URLs (private
+# bucket), 'proxy' streams files through the app (Range, ETag, 304) and
+# 'redirect' sends the browser to the public storage URL
+DOWNLOAD_MODE = os.getenv("DOWNLOAD_MODE", "signed")
 
-# Maximum file size (50MB)
-MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB in bytes
+# Direct uploads: the browser sends file bytes straight to storage through a
+# presigned URL and the app only records metadata. Off by default: the bytes
+# never pass through the app, so these documents get no SHA-256 and skip
+# deduplication (1 enables it)
+DIRECT_UPLOADS = os.getenv("DIRECT_UPLOADS", "0") == "1"
 
-# Supabase Storage bucket name
-STORAGE_BUCKET = "documents"
+# Upload deduplication by SHA-256: 'user' (same owner), 'global' (anyone) or 'off'
+DEDUP_SCOPE = os.getenv("DEDUP_SCOPE", "user")
 
 # Check if running in production (Vercel sets VERCEL env var)
 IS_PRODUCTION = os.getenv("VERCEL") is not None
 BASE_URL = os.getenv("BASE_URL", "https://doc-urp.vercel.app" if IS_PRODUCTION else "http://localhost:8000")
 
-app, rt = fast_app(
-    live=not IS_PRODUCTION,  # Disable live-reload in production
-    hdrs=(
-        Script(src='https://cdn.tailwindcss.com'),
-        Link(rel='preconnect', href='https://fonts.googleapis.com'),
-        Link(rel='preconnect', href='https://fonts.gstatic.com', crossorigin='anonymous'),
-        Link(rel='stylesheet', href='https://fonts.googleapis.com/css2?family=Outfit:wght@300;400;500;600;700&display=swap'),
-        Script("""
-            tailwind.config = {
-                theme: {
-                    extend: {
-                        colors: {
-                            'brand': '#34B27B',
-                            'brand-dark': '#11181C',
-                            'brand-light': '#F8F9FA',
-                            'primary': '#34B27B',
-                            'primary-dark': '#2A9063',
-                        },
-                        fontFamily: {
-                            'sans': ['Outfit', 'sans-serif'],
-                        }
-                    }
+with boot_phase('fast_app'):
+    app, rt = fast_app(
+        live=not IS_PRODUCTION,  # Disable live-reload in production
+        hdrs=(
+            # Purged Tailwind build (python build_css.py), content-hashed
+            Link(rel='stylesheet', href=asset_url('css/app.css')),
+            Link(rel='preconnect', href='https://fonts.googleapis.com'),
+            Link(rel='preconnect', href='https://fonts.gstatic.com', crossorigin='anonymous'),
+            Link(rel='stylesheet', href='https://fonts.googleapis.com/css2?family=Outfit:wght@300;400;500;600;700&display=swap'),
+            Link(rel='stylesheet', href='https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.1/css/all.min.css'),
+            Style("""
+                :root {
+                    --background: #F8F9FA;
+                    --foreground: #11181C;
+                    --card: #FFFFFF;
+                    --card-foreground: #11181C;
+                    --primary: #34B27B;
+                    --primary-foreground: #FFFFFF;
+                    --secondary: #F8F9FA;
+                    --secondary-foreground: #11181C;
+                    --border: #E5E7EB;
+                    --input: #FFFFFF;
+                    --radius: 0.5rem;
                 }
-            }
-        """),
-        Link(rel='stylesheet', href='https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.1/css/all.min.css'),
-        Style("""
-            :root {
-                --background: #F8F9FA;
-                --foreground: #11181C;
-                --card: #FFFFFF;
-                --card-foreground: #11181C;
-                --primary: #34B27B;
-                --primary-foreground: #FFFFFF;
-                --secondary: #F8F9FA;
-                --secondary-foreground: #11181C;
-                --border: #E5E7EB;
-                --input: #FFFFFF;
-                --radius: 0.5rem;
-            }
-            
-            body {
-                font-family: 'Outfit', sans-serif;
-            }
-        """),
+                
+                body {
+                    font-family: 'Outfit', sans-serif;
+                }
+            """),
+        )
     )
-)
 
-# Initialize Supabase client
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
-supabase_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+# fast_app's catch-all /{fname}.{ext} route serves the project root and
+# shadows /static below; static assets only come from /static
+app.router.routes[:] = [r for r in app.router.routes if getattr(r, 'name', None) != 'static_route_exts_get']
+
+# Paths that require a signed-in user; RequestAuthMiddleware resolves it once
+# (request.state.user / request.state.access_token) before the handler runs
+PROTECTED_PATHS = ('/dashboard', '/upload', '/uploads', '/delete', '/download', '/view')
+
+# Middleware added last runs first: refresh the token, then authenticate
+app.add_middleware(RequestAuthMiddleware, protected=PROTECTED_PATHS)
+app.add_middleware(TokenRefreshMiddleware)
+# Outermost: compress and set cache headers on the final response
+app.add_middleware(CompressionMiddleware)
 
 # Utility functions
-def get_current_user(request):
-    """Get current user from Supabase session"""
+async def get_current_user(request):
+    """Get current user from Supabase session (verified locally, cached by token hash);
+    reuses the user RequestAuthMiddleware already resolved for this request"""
+    if hasattr(request.state, 'user'):
+        return request.state.user
     access_token = request.cookies.get('sb_access_token')
-    if access_token:
-        try:
-            response = supabase_client.auth.get_user(access_token)
-            return response.user if response and response.user else None
-        except Exception as e:
-            print(f"Error getting user: {e}")
-            return None
-    return None
+    user = await verify_access_token(access_token) if access_token else None
+    request.state.user = user
+    return user
+
+async def get_request_profile(request):
+    """Profile of the request's user, loaded at most once per request"""
+    if not hasattr(request.state, 'profile'):
+        user = await get_current_user(request)
+        request.state.profile = await get_user_profile(user.id) if user else None
+    return request.state.profile
 
 def is_urp_email(email: str) -> bool:
     """Validate that email is from @urp.edu.pe domain"""
@@ -101,15 +115,15 @@ def is_urp_email(email: str) -> bool:
 
 # Routes
 @rt('/')
-def get(request):
+async def get(request):
     """Home page - redirect to login or dashboard"""
-    current_user = get_current_user(request)
+    current_user = await get_current_user(request)
     if current_user:
         return RedirectResponse('/dashboard', status_code=303)
     return RedirectResponse('/login', status_code=303)
 
-@rt('/register')
-def get():
+@static_shell('/register')
+def register_page():
     """Registration page"""
     return Div(
         # Background with blur effect
@@ -288,6 +302,11 @@ def get():
         cls='relative min-h-screen overflow-hidden'
     )
 
+@rt('/register')
+def get(request):
+    """Registration page (prerendered once, see shells.py)"""
+    return serve_shell(request, '/register', BASE_URL)
+
 @rt('/register')
 async def post(email: str, password: str, confirm_password: str, name: str, student_code: str):
     """Handle registration with Supabase Auth"""
@@ -515,8 +534,8 @@ async def post(email: str, password: str, confirm_password: str, name: str, stud
         cls='relative min-h-screen overflow-hidden'
     )
 
-@rt('/login')
-def get():
+@static_shell('/login')
+def login_page():
     """Login page"""
     return Div(
         # Background with blur effect
@@ -638,6 +657,11 @@ def get():
         cls='relative min-h-screen overflow-hidden'
     )
 
+@rt('/login')
+def get(request):
+    """Login page (prerendered once, see shells.py)"""
+    return serve_shell(request, '/login', BASE_URL)
+
 @rt('/login')
 async def post(email: str, password: str):
     """Handle login with Supabase Auth"""
@@ -681,34 +705,26 @@ async def post(email: str, password: str):
     
     # Set Supabase session cookies
     response = RedirectResponse('/dashboard', status_code=303)
-    response.set_cookie(
-        key='sb_access_token',
-        value=auth_response.session.access_token,
-        httponly=True,
-        max_age=auth_response.session.expires_in,
-        secure=True,
-        samesite='lax'
-    )
-    response.set_cookie(
-        key='sb_refresh_token',
-        value=auth_response.session.refresh_token,
-        httponly=True,
-        max_age=7*24*60*60,  # 7 days
-        secure=True,
-        samesite='lax'
-    )
+    set_session_cookies(response, {
+        'access_token': auth_response.session.access_token,
+        'refresh_token': auth_response.session.refresh_token,
+        'expires_in': auth_response.session.expires_in,
+    })
     return response
 
 @rt('/logout')
-def get():
+def get(request):
     """Logout user"""
+    access_token = request.cookies.get('sb_access_token')
+    if access_token:
+        forget_access_token(access_token)
     response = RedirectResponse('/login', status_code=303)
     response.delete_cookie('sb_access_token')
     response.delete_cookie('sb_refresh_token')
     return response
 
-@rt('/forgot-password')
-def get():
+@static_shell('/forgot-password')
+def forgot_password_page():
     """Forgot password page"""
     return Div(
         # Background with blur effect
@@ -816,6 +832,11 @@ def get():
         cls='relative min-h-screen overflow-hidden'
     )
 
+@rt('/forgot-password')
+def get(request):
+    """Forgot password page (prerendered once, see shells.py)"""
+    return serve_shell(request, '/forgot-password', BASE_URL)
+
 @rt('/forgot-password')
 async def post(email: str, request):
     """Handle password reset email"""
@@ -880,8 +901,8 @@ async def post(email: str, request):
             cls='relative min-h-screen overflow-hidden'
         )
 
-@rt('/reset-password')
-def get(request):
+@static_shell('/reset-password')
+def reset_password_page():
     """Reset password page - user arrives here from email link"""
     # Get access_token from URL params (Supabase sends it as #access_token=... but browsers convert to query param)
     return Div(
@@ -1021,6 +1042,11 @@ def get(request):
         cls='relative min-h-screen overflow-hidden'
     )
 
+@rt('/reset-password')
+def get(request):
+    """Reset password page (prerendered once, see shells.py)"""
+    return serve_shell(request, '/reset-password', BASE_URL)
+
 @rt('/reset-password')
 async def post(password: str, confirm_password: str, access_token: str = None):
     """Handle password reset"""
@@ -1076,12 +1102,8 @@ async def post(password: str, confirm_password: str, access_token: str = None):
     
     # Update password using Supabase
     try:
-        # Set session with the access token
-        supabase_client.auth.set_session(access_token, access_token)
-        # Update password
-        response = supabase_client.auth.update_user({"password": password})
-        
-        if response:
+        # Update password as the user owning the recovery token
+        if await update_user_password(access_token, password):
             # Success
             return Div(
                 Div(cls='absolute inset-0 bg-gradient-to-br from-brand-dark via-gray-900 to-brand-dark'),
@@ -1132,18 +1154,152 @@ async def post(password: str, confirm_password: str, access_token: str = None):
         cls='relative min-h-screen overflow-hidden'
     )
 
+# Dashboard document grid
+DOCUMENT_CATEGORIES = [
+    ('Documentos PDF', 'pdf'),
+    ('Documentos Word', 'word'),
+    ('Hojas de Cálculo Excel', 'excel'),
+]
+
+def document_category(mime_type: str):
+    """Dashboard category ('pdf', 'word', 'excel') for a mime type, or None"""
+    mime_type = (mime_type or '').lower()
+    if mime_type == 'application/pdf':
+        return 'pdf'
+    if 'word' in mime_type and 'sheet' not in mime_type:
+        return 'word'
+    if 'excel' in mime_type or 'sheet' in mime_type or 'spreadsheet' in mime_type:
+        return 'excel'
+    return None
+
+def group_documents(documents):
+    """Split documents by dashboard category in a single pass"""
+    grouped = {category_type: [] for _, category_type in DOCUMENT_CATEGORIES}
+    for doc in documents:
+        category = document_category(doc['mime_type'])
+        if category:
+            grouped[category].append(doc)
+    return grouped
+
+async def download_links(documents) -> dict:
+    """Download href per document id; in signed mode the whole page is signed
+    with one (cached) storage call so clicks go straight to storage"""
+    if DOWNLOAD_MODE != 'signed' or not documents:
+        return {}
+    urls = await create_signed_urls([doc['stored_filename'] for doc in documents])
+    return {
+        doc['id']: f"{urls[doc['stored_filename']]}&download={quote(doc['filename'])}"
+        for doc in documents if doc['stored_filename'] in urls
+    }
+
+def document_card(doc, category: str, href: str = None):
+    """Card for one document in the dashboard grid"""
+    return Div(
+        Div(
+            Div(
+                # Selection for the bulk delete form (linked by id, so later pages work too)
+                Input(
+                    type='checkbox',
+                    name='ids',
+                    value=doc['id'],
+                    form='bulk-delete',
+                    title='Seleccionar',
+                    cls='w-4 h-4 mr-4 accent-brand cursor-pointer shrink-0'
+                ),
+                Div(
+                    I(cls=f"fas fa-file-{category} text-3xl text-brand"),
+                    cls='flex items-center justify-center w-16 h-16 bg-brand/10 rounded-xl'
+                ),
+                Div(
+                    Strong(doc['filename'], cls='text-lg text-white block mb-1 line-clamp-1'),
+                    P((doc['description'][:50] + '...' if doc['description'] and len(doc['description']) > 50 else doc['description']) or 'Sin descripción', cls='text-sm text-gray-400 mb-2 line-clamp-1'),
+                    Div(
+                        Span(
+                            I(cls='fas fa-calendar text-brand text-xs mr-1'),
+                            doc['uploaded_at'][:10],
+                            cls='text-xs text-gray-400 mr-4'
+                        ),
+                        Span(
+                            I(cls='fas fa-hdd text-brand text-xs mr-1'),
+                            f"{doc['file_size'] / 1024:.1f} KB",
+                            cls='text-xs text-gray-400'
+                        ),
+                        cls='flex items-center'
+                    ),
+                    cls='ml-4 flex-1 min-w-0'
+                ),
+                cls='flex items-center flex-1 min-w-0'
+            ),
+            Div(
+                A(
+                    I(cls='fas fa-download text-xl'),
+                    href=href or f"/download/{doc['id']}",
+                    cls='flex items-center justify-center w-10 h-10 text-brand hover:text-primary-dark transition transform hover:scale-125',
+                    title='Descargar'
+                ),
+                Form(
+                    Button(
+                        I(cls='fas fa-trash text-xl'),
+                        type='submit',
+                        cls='flex items-center justify-center w-10 h-10 text-red-400 hover:text-red-500 transition transform hover:scale-125 bg-transparent border-0 p-0',
+                        title='Eliminar',
+                        onclick='return confirm("¿Estás seguro de eliminar este documento?")'
+                    ),
+                    action=f'/delete/{doc["id"]}',
+                    method='post'
+                ),
+                cls='flex gap-2'
+            ),
+            cls='flex items-center gap-4'
+        ),
+        cls='bg-white/5 backdrop-blur-xl hover:bg-white/10 rounded-2xl p-5 border border-white/10 transition hover:shadow-xl hover:scale-[1.01] duration-200',
+        **{'data-doc-name': doc['filename'], 'data-doc-desc': doc['description'] or ''}
+    )
+
+# Rendered card HTML per document version; the download href (signed URLs
+# rotate) is substituted on every render
+CARD_CACHE_SIZE = int(os.getenv("CARD_CACHE_SIZE", "20000"))
+CARD_CACHE_TTL = int(os.getenv("CARD_CACHE_TTL", "3600"))  # seconds
+CARD_HREF_MARKER = '__card_href__'
+card_cache = TTLCache(maxsize=CARD_CACHE_SIZE, ttl=CARD_CACHE_TTL)
+
+def cached_card(doc, category: str, href: str = None):
+    """document_card as a prerendered HTML fragment, keyed by id + version + category"""
+    key = (doc['id'], doc.get('updated_at') or doc['uploaded_at'], category)
+    fragment = card_cache.get(key)
+    if fragment is None:
+        fragment = to_xml(document_card(doc, category, CARD_HREF_MARKER))
+        card_cache.set(key, fragment)
+    return NotStr(fragment.replace(CARD_HREF_MARKER, html.escape(href or f"/download/{doc['id']}")))
+
+def documents_more(next_cursor):
+    """Infinite-scroll sentinel that loads the next page of cards"""
+    if not next_cursor:
+        return Div(id='doc-more')
+    return Div(
+        Button(
+            I(cls='fas fa-chevron-down mr-2'),
+            'Cargar más',
+            type='button',
+            cls='px-6 py-2.5 bg-white/10 text-gray-300 rounded-lg font-semibold transition hover:bg-white/20 inline-flex items-center justify-center'
+        ),
+        id='doc-more',
+        hx_get=f'/dashboard/documents?cursor={next_cursor}',
+        hx_trigger='revealed, click',
+        hx_swap='outerHTML',
+        cls='flex justify-center pt-2'
+    )
+
 @rt('/dashboard')
 async def get(request):
     """Dashboard - main page for document management"""
-    current_user = get_current_user(request)
-    if not current_user:
-        return RedirectResponse('/login', status_code=303)
+    current_user = request.state.user
     
     # Get user profile and documents in parallel (optimized)
     import asyncio
-    profile, documents = await asyncio.gather(
-        get_user_profile(current_user.id),
-        get_user_documents(current_user.id)
+    profile, (documents, next_cursor) = await asyncio.gather(
+        get_request_profile(request),
+        list_user_documents(current_user.id)
     )
     
     if not profile:
@@ -1153,6 +1309,9 @@ async def get(request):
         response.delete_cookie('sb_refresh_token')
         return response
     
+    grouped = group_documents(documents)
+    links = await download_links(documents)
+    
     # Get error message from query params
     error = request.query_params.get('error', '')
     error_messages = {
@@ -1229,10 +1388,11 @@ async def get(request):
                                 type='file',
                                 name='file',
                                 accept='.pdf,.doc,.docx,.xls,.xlsx',
+                                multiple=True,
                                 required=True,
                                 cls='hidden',
                                 id='file-input',
-                                onchange="document.getElementById('file-name').textContent = this.files[0]?.name || ''; document.getElementById('upload-text').textContent = this.files[0] ? 'Archivo seleccionado:' : 'Click para seleccionar o arrastra tu archivo aquí';"
+                                onchange="document.getElementById('file-name').textContent = this.files.length > 1 ? this.files.length + ' archivos' : (this.files[0]?.name || ''); document.getElementById('upload-text').textContent = this.files.length > 1 ? 'Archivos seleccionados:' : this.files[0] ? 'Archivo seleccionado:' : 'Click para seleccionar o arrastra tu archivo aquí';"
                             ),
                             cls='block w-full border-2 border-dashed border-white/20 rounded-2xl hover:border-brand transition cursor-pointer bg-white/5 hover:bg-white/10',
                             **{'for': 'file-input'}
@@ -1255,10 +1415,98 @@ async def get(request):
                         type='submit',
                         cls='w-full bg-brand hover:bg-primary-dark text-white py-3.5 rounded-xl font-semibold transform hover:scale-[1.02] transition duration-200 shadow-lg shadow-brand/30 inline-flex items-center justify-center'
                     ),
+                    # Without JavaScript the form falls back to the single-file /upload
                     action='/upload',
                     method='post',
-                    enctype='multipart/form-data'
+                    enctype='multipart/form-data',
+                    id='upload-form',
+                    **({'onsubmit': 'return directUpload(event)'} if DIRECT_UPLOADS else {
+                        'hx_post': '/upload/batch',
+                        'hx_encoding': 'multipart/form-data',
+                        'hx_target': '#upload-results',
+                        'hx_swap': 'innerHTML',
+                        'hx_disabled_elt': 'find button'
+                    })
                 ),
+                Div(id='upload-results'),
+                Script(f"""
+                    const UPLOAD_MESSAGES = {json.dumps(BATCH_STATUS_MESSAGES)};
+                    const UPLOAD_CONCURRENCY = {UPLOAD_CONCURRENCY};
+                    
+                    function renderUploadResults(results) {{
+                        const box = document.getElementById('upload-results');
+                        box.innerHTML = '';
+                        const list = document.createElement('div');
+                        list.className = 'mt-6 bg-white/5 rounded-xl p-4 border border-white/10';
+                        results.forEach(r => {{
+                            const row = document.createElement('div');
+                            row.className = 'flex items-center py-1';
+                            const icon = document.createElement('i');
+                            icon.className = r.status === 'ok' ? 'fas fa-check-circle text-brand mr-2' : 'fas fa-times-circle text-red-400 mr-2';
+                            const name = document.createElement('span');
+                            name.className = 'text-white text-sm flex-1 min-w-0 truncate';
+                            name.textContent = r.filename;
+                            const status = document.createElement('span');
+                            status.className = 'text-xs text-gray-400 ml-3';
+                            status.textContent = UPLOAD_MESSAGES[r.status] || r.status;
+                            row.append(icon, name, status);
+                            list.append(row);
+                        }});
+                        if (results.some(r => r.status === 'ok')) {{
+                            const refresh = document.createElement('a');
+                            refresh.href = '/dashboard';
+                            refresh.className = 'inline-flex items-center text-brand hover:text-primary-dark text-sm font-semibold mt-3';
+                            refresh.innerHTML = '<i class="fas fa-sync-alt mr-2"></i>Actualizar documentos';
+                            list.append(refresh);
+                        }}
+                        box.append(list);
+                    }}
+                    
+                    // Presign, upload straight to storage, then finalize (metadata only)
+                    async function directUploadFile(file, description) {{
+                        const sign = await fetch('/uploads/direct', {{method: 'POST', body: new URLSearchParams({{filename: file.name, size: file.size}})}});
+                        if (sign.status === 401) {{ window.location.href = '/login'; return 'upload_failed'; }}
+                        const ticket = await sign.json();
+                        if (!sign.ok) return ticket.error || 'upload_failed';
+                        const body = new FormData();
+                        body.append('cacheControl', '3600');
+                        body.append('', file);
+                        const put = await fetch(ticket.upload_url, {{method: 'PUT', body: body, headers: {{'x-upsert': 'false'}}}});
+                        if (!put.ok) return 'upload_failed';
+                        const done = await fetch('/uploads/direct/finalize', {{method: 'POST', body: new URLSearchParams({{stored_filename: ticket.stored_filename, filename: file.name, description: description}})}});
+                        if (!done.ok) return (await done.json()).error || 'upload_failed';
+                        return 'ok';
+                    }}
+                    
+                    async function directUpload(event) {{
+                        const form = event.target;
+                        const files = Array.from(document.getElementById('file-input').files);
+                        // Without fetch the form posts to /upload as usual
+                        if (!window.fetch || !files.length) return true;
+                        event.preventDefault();
+                        const button = form.querySelector('button');
+                        button.disabled = true;
+                        const description = form.querySelector('[name=description]').value;
+                        const queue = files.slice();
+                        const results = [];
+                        async function worker() {{
+                            while (queue.length) {{
+                                const file = queue.shift();
+                                let status;
+                                try {{
+                                    status = await directUploadFile(file, description);
+                                }} catch (e) {{
+                                    status = 'upload_failed';
+                                }}
+                                results.push({{filename: file.name, status: status}});
+                                renderUploadResults(results);
+                            }}
+                        }}
+                        await Promise.all(Array.from({{length: Math.min(UPLOAD_CONCURRENCY, files.length)}}, worker));
+                        button.disabled = false;
+                        return false;
+                    }}
+                """) if DIRECT_UPLOADS else None,
                 cls='bg-white/5 backdrop-blur-xl shadow-lg rounded-2xl p-8 mb-8 border border-white/10'
             ),
             
@@ -1271,6 +1519,19 @@ async def get(request):
                         Div(
                             I(cls='fas fa-folder-open text-brand text-2xl mr-3'),
                             H2('Mis Documentos', cls='text-2xl font-bold text-white font-sans'),
+                            Form(
+                                Button(
+                                    I(cls='fas fa-trash mr-2'),
+                                    'Eliminar seleccionados',
+                                    type='submit',
+                                    cls='inline-flex items-center bg-red-500/10 hover:bg-red-500/20 text-red-400 px-4 py-2 rounded-lg text-sm font-semibold transition border border-red-500/30'
+                                ),
+                                id='bulk-delete',
+                                action='/delete',
+                                method='post',
+                                onsubmit='return confirm("¿Estás seguro de eliminar los documentos seleccionados?")',
+                                cls='ml-auto'
+                            ),
                             cls='flex items-center mb-6'
                         ),
                         # Search and Filters
@@ -1278,10 +1539,17 @@ async def get(request):
                             # Search bar
                             Div(
                                 Input(
-                                    type='text',
+                                    type='search',
                                     id='search-input',
+                                    name='q',
                                     placeholder='Buscar documentos...',
-                                    oninput='searchDocs()',
+                                    autocomplete='off',
+                                    oninput='toggleSearchResults()',
+                                    hx_get='/dashboard/search',
+                                    hx_trigger='input changed delay:250ms, search',
+                                    hx_target='#search-results',
+                                    hx_swap='innerHTML',
+                                    hx_sync='this:replace',
                                     cls='w-full px-4 py-2.5 bg-white/5 border border-white/10 text-white placeholder-gray-400 rounded-lg focus:outline-none focus:ring-2 focus:ring-brand focus:border-transparent transition'
                                 ),
                                 cls='mb-3 w-full'
@@ -1323,7 +1591,26 @@ async def get(request):
                     ),
                     
                     Script("""
+                        let currentDocFilter = 'all';
+                        
+                        // Show categories that have cards and match the active filter
+                        function refreshDocCategories() {
+                            const categories = document.querySelectorAll('[data-category]');
+                            categories.forEach(cat => {
+                                const catType = cat.getAttribute('data-category');
+                                const hasDocs = cat.querySelector('[data-doc-name]') !== null;
+                                const matches = currentDocFilter === 'all' || currentDocFilter === catType;
+                                cat.style.display = hasDocs && matches ? 'block' : 'none';
+                            });
+                        }
+                        
+                        // Pages loaded by the infinite-scroll sentinel may fill empty categories
+                        document.body.addEventListener('htmx:oobAfterSwap', refreshDocCategories);
+                        document.body.addEventListener('htmx:afterSettle', refreshDocCategories);
+                        
                         function filterDocs(type) {
+                            currentDocFilter = type;
+                            
                             // Update button styles
                             const buttons = ['all', 'pdf', 'word', 'excel'];
                             buttons.forEach(btn => {
@@ -1336,139 +1623,49 @@ async def get(request):
                             });
                             
                             // Show/hide categories
-                            const categories = document.querySelectorAll('[data-category]');
-                            categories.forEach(cat => {
-                                const catType = cat.getAttribute('data-category');
-                                if (type === 'all' || type === catType) {
-                                    cat.style.display = 'block';
-                                } else {
-                                    cat.style.display = 'none';
-                                }
-                            });
+                            refreshDocCategories();
                             
                             // Clear search when filtering
                             document.getElementById('search-input').value = '';
+                            toggleSearchResults();
                         }
                         
-                        function searchDocs() {
-                            const searchTerm = document.getElementById('search-input').value.toLowerCase().trim();
-                            const docCards = document.querySelectorAll('[data-doc-name]');
-                            
-                            // If search is empty, show all documents
-                            if (searchTerm === '') {
-                                docCards.forEach(card => {
-                                    card.style.display = 'block';
-                                });
-                                const categories = document.querySelectorAll('[data-category]');
-                                categories.forEach(cat => {
-                                    cat.style.display = 'block';
-                                });
-                                return;
-                            }
-                            
-                            // First, show/hide individual documents
-                            docCards.forEach(card => {
-                                const docName = (card.getAttribute('data-doc-name') || '').toLowerCase();
-                                const docDesc = (card.getAttribute('data-doc-desc') || '').toLowerCase();
-                                
-                                if (docName.includes(searchTerm) || docDesc.includes(searchTerm)) {
-                                    card.style.display = 'block';
-                                } else {
-                                    card.style.display = 'none';
-                                }
-                            });
-                            
-                            // Show/hide categories based on visible documents
-                            const categories = document.querySelectorAll('[data-category]');
-                            categories.forEach(cat => {
-                                const docsInCategory = cat.querySelectorAll('[data-doc-name]');
-                                
-                                // Count visible documents in this category
-                                let hasVisibleDocs = false;
-                                docsInCategory.forEach(doc => {
-                                    if (doc.style.display !== 'none') {
-                                        hasVisibleDocs = true;
-                                    }
-                                });
-                                
-                                // Show category only if it has visible documents
-                                cat.style.display = hasVisibleDocs ? 'block' : 'none';
-                            });
+                        // Searching is done server-side (/dashboard/search); while a query
+                        // is active its results replace the category listing
+                        function toggleSearchResults() {
+                            const searching = document.getElementById('search-input').value.trim() !== '';
+                            document.getElementById('doc-browser').style.display = searching ? 'none' : '';
+                            const results = document.getElementById('search-results');
+                            results.style.display = searching ? '' : 'none';
+                            if (!searching) results.innerHTML = '';
                         }
+
                     """),
                     
-                    # Helper function to categorize documents
-                    *[
+                    # Search results (filled by /dashboard/search)
+                    Div(id='search-results', cls='space-y-3', style='display: none'),
+                    
+                    # Documents grouped by type (later pages are appended by /dashboard/documents)
+                    Div(*[
                         Div(
                             H3(
-                                I(cls=f'fas fa-file-{category_icon} text-brand mr-2'),
+                                I(cls=f'fas fa-file-{category_type} text-brand mr-2'),
                                 category_name,
                                 cls='text-xl font-bold text-white mb-4 flex items-center'
                             ),
                             Div(
-                                *[Div(
-                                    Div(
-                                        Div(
-                                            Div(
-                                                I(cls=f"fas fa-file-{category_icon} text-3xl text-brand"),
-                                                cls='flex items-center justify-center w-16 h-16 bg-brand/10 rounded-xl'
-                                            ),
-                                            Div(
-                                                Strong(doc['filename'], cls='text-lg text-white block mb-1 line-clamp-1'),
-                                                P((doc['description'][:50] + '...' if doc['description'] and len(doc['description']) > 50 else doc['description']) or 'Sin descripción', cls='text-sm text-gray-400 mb-2 line-clamp-1'),
-                                                Div(
-                                                    Span(
-                                                        I(cls='fas fa-calendar text-brand text-xs mr-1'),
-                                                        doc['uploaded_at'][:10],
-                                                        cls='text-xs text-gray-400 mr-4'
-                                                    ),
-                                                    Span(
-                                                        I(cls='fas fa-hdd text-brand text-xs mr-1'),
-                                                        f"{doc['file_size'] / 1024:.1f} KB",
-                                                        cls='text-xs text-gray-400'
-                                                    ),
-                                                    cls='flex items-center'
-                                                ),
-                                                cls='ml-4 flex-1 min-w-0'
-                                            ),
-                                            cls='flex items-center flex-1 min-w-0'
-                                        ),
-                                        Div(
-                                            A(
-                                                I(cls='fas fa-download text-xl'),
-                                                href=f"/download/{doc['id']}",
-                                                cls='flex items-center justify-center w-10 h-10 text-brand hover:text-primary-dark transition transform hover:scale-125',
-                                                title='Descargar'
-                                            ),
-                                            Form(
-                                                Button(
-                                                    I(cls='fas fa-trash text-xl'),
-                                                    type='submit',
-                                                    cls='flex items-center justify-center w-10 h-10 text-red-400 hover:text-red-500 transition transform hover:scale-125 bg-transparent border-0 p-0',
-                                                    title='Eliminar',
-                                                    onclick='return confirm("¿Estás seguro de eliminar este documento?")'
-                                                ),
-                                                action=f'/delete/{doc["id"]}',
-                                                method='post'
-                                            ),
-                                            cls='flex gap-2'
-                                        ),
-                                        cls='flex items-center gap-4'
-                                    ),
-                                    cls='bg-white/5 backdrop-blur-xl hover:bg-white/10 rounded-2xl p-5 border border-white/10 transition hover:shadow-xl hover:scale-[1.01] duration-200',
-                                    **{'data-doc-name': doc['filename'], 'data-doc-desc': doc['description'] or ''}
-                                ) for doc in category_docs],
+                                *[cached_card(doc, category_type, links.get(doc['id'])) for doc in grouped[category_type]],
+                                id=f'doc-list-{category_type}',
                                 cls='space-y-3'
                             ),
                             cls='mb-8',
+                            style=None if grouped[category_type] else 'display: none',
                             **{'data-category': category_type}
-                        ) if category_docs else None
-                        for category_name, category_icon, category_docs, category_type in [
-                            ('Documentos PDF', 'pdf', [d for d in documents if d['mime_type'] == 'application/pdf'], 'pdf'),
-                            ('Documentos Word', 'word', [d for d in documents if 'word' in d['mime_type'].lower() and 'sheet' not in d['mime_type'].lower()], 'word'),
-                            ('Hojas de Cálculo Excel', 'excel', [d for d in documents if 'excel' in d['mime_type'].lower() or 'sheet' in d['mime_type'].lower() or 'spreadsheet' in d['mime_type'].lower()], 'excel')
-                        ]
+                        )
+                        for category_name, category_type in DOCUMENT_CATEGORIES
                     ],
+                    documents_more(next_cursor),
+                    id='doc-browser'),
                     cls='bg-white/5 backdrop-blur-xl shadow-lg rounded-2xl p-8 border border-white/10'
                 )
             ] if documents else [
@@ -1493,113 +1690,152 @@ async def get(request):
         cls='relative min-h-screen overflow-hidden'
     )
 
-@rt('/upload')
-async def post(request):
-    """Handle file upload to Supabase Storage"""
-    current_user = get_current_user(request)
-    if not current_user:
-        return RedirectResponse('/login', status_code=303)
-    
-    # Get user's access token for RLS
-    access_token = request.cookies.get('sb_access_token')
-    if not access_token:
-        return RedirectResponse('/login', status_code=303)
+@rt('/dashboard/documents')
+async def get(request, cursor: str = None):
+    """Next page of document cards (HTMX fragment appended to each category)"""
+    current_user = request.state.user
     
-    form = await request.form()
-    file = form.get('file')
-    description = form.get('description', '')
+    if decode_cursor(cursor) is None:
+        return documents_more(None)
     
-    if not file or not file.filename:
-        return RedirectResponse('/dashboard?error=no_file', status_code=303)
+    documents, next_cursor = await list_user_documents(current_user.id, cursor=cursor)
+    grouped = group_documents(documents)
+    links = await download_links(documents)
     
-    # Validate file extension
-    file_ext = Path(file.filename).suffix.lower()
-    if file_ext not in ALLOWED_EXTENSIONS:
-        return RedirectResponse('/dashboard?error=invalid_file', status_code=303)
-    
-    # Read file content first to check size
-    content = await file.read()
-    
-    # Validate file size (50MB max)
-    if len(content) > MAX_FILE_SIZE:
-        print(f"❌ File too large: {len(content)} bytes (max {MAX_FILE_SIZE})")
-        return RedirectResponse('/dashboard?error=file_too_large', status_code=303)
-    
-    if len(content) == 0:
-        print(f"❌ File is empty")
-        return RedirectResponse('/dashboard?error=empty_file', status_code=303)
+    return (
+        documents_more(next_cursor),
+        *[Div(
+            *[cached_card(doc, category_type, links.get(doc['id'])) for doc in grouped[category_type]],
+            id=f'doc-list-{category_type}',
+            hx_swap_oob='beforeend'
+        ) for _, category_type in DOCUMENT_CATEGORIES if grouped[category_type]]
+    )
+
+def search_more(q: str, next_offset):
+    """Load-more button for the next page of search results"""
+    if next_offset is None:
+        return ''
+    return Div(
+        Button(
+            I(cls='fas fa-chevron-down mr-2'),
+            'Más resultados',
+            type='button',
+            cls='px-6 py-2.5 bg-white/10 text-gray-300 rounded-lg font-semibold transition hover:bg-white/20 inline-flex items-center justify-center'
+        ),
+        hx_get=f'/dashboard/search?{urlencode({"q": q, "offset": next_offset})}',
+        hx_trigger='revealed, click',
+        hx_swap='outerHTML',
+        cls='flex justify-center pt-2'
+    )
+
+@rt('/dashboard/search')
+async def get(request, q: str = '', offset: int = 0):
+    """Ranked full-text search results (HTMX fragment, paginated)"""
+    current_user = request.state.user
     
-    # Sanitize filename: remove special characters and normalize
-    import re
-    import unicodedata
+    q = q.strip()[:200]
+    if not q:
+        return ''
     
-    # Normalize unicode characters (ñ -> n, á -> a, etc.)
-    normalized = unicodedata.normalize('NFKD', file.filename)
-    ascii_name = normalized.encode('ASCII', 'ignore').decode('ASCII')
+    documents, next_offset = await search_user_documents(current_user.id, q, offset=offset)
+    links = await download_links(documents)
+    if not documents and not offset:
+        return P(
+            I(cls='fas fa-search mr-2'),
+            f'Sin resultados para "{q}"',
+            cls='text-center text-gray-400 py-10'
+        )
     
-    # Keep only alphanumeric, dots, hyphens, and underscores
-    clean_name = re.sub(r'[^\w.-]', '_', ascii_name)
+    return (
+        *[cached_card(doc, document_category(doc['mime_type']) or 'alt', links.get(doc['id'])) for doc in documents],
+        search_more(q, next_offset)
+    )
+
+async def deduplicate_uploads(user_id: str, uploads: list):
+    """Point uploads whose content is already stored at the existing object
+    (also collapses duplicates within a batch). The fresh copy is kept in
+    upload['fresh_copy'] until release_duplicates runs after the insert."""
+    if DEDUP_SCOPE == 'off' or not uploads:
+        return
+    stored = await find_documents_by_hash(
+        [u['content_sha256'] for u in uploads],
+        None if DEDUP_SCOPE == 'global' else user_id
+    )
+    for upload in uploads:
+        existing = stored.setdefault(upload['content_sha256'], upload)['stored_filename']
+        if existing != upload['stored_filename']:
+            upload['fresh_copy'] = upload['stored_filename']
+            upload['stored_filename'] = existing
+            upload['deduplicated'] = True
+
+async def release_duplicates(user_id: str, saved: list):
+    """Once the rows exist, remove the fresh copies of deduplicated uploads.
+    saved pairs each upload with its inserted row. A shared object that is gone
+    by now (its last row was deleted concurrently) leaves the row on its own
+    copy instead; deletes re-check references after our insert (see
+    remove_unreferenced_files), so the object cannot vanish after this check."""
+    saved = [(upload, doc) for upload, doc in saved if upload.get('fresh_copy') and doc]
+    if not saved:
+        return
+    missing = {path for path in {upload['stored_filename'] for upload, _ in saved} if await probe_file(path) is None}
+    copies = []
+    for upload, doc in saved:
+        if upload['stored_filename'] not in missing:
+            copies.append(upload['fresh_copy'])
+            continue
+        file_url = await get_public_url(upload['fresh_copy'])
+        if await update_document_file(user_id, doc['id'], upload['fresh_copy'], file_url):
+            upload['stored_filename'] = doc['stored_filename'] = upload['fresh_copy']
+            upload['deduplicated'] = False
+    if missing:
+        # May be back from the trash by now; removed again once unreferenced
+        await remove_unreferenced_files(missing)
+    if copies:
+        print(f"♻️ Reusing stored content for {len(copies)} upload(s)")
+        await remove_files(copies)
+
+async def record_upload(user_id: str, upload: dict):
+    """Save the documents row for a file already in storage"""
+    print(f"✅ File uploaded to storage: {upload['stored_filename']} ({upload['file_size']} bytes)")
+    if 'content_sha256' in upload and not upload.get('deduplicated'):
+        await deduplicate_uploads(user_id, [upload])
     
-    # Replace multiple underscores with single one
-    clean_name = re.sub(r'_{2,}', '_', clean_name)
+    # Get public URL
+    file_url = await get_public_url(upload['stored_filename'])
+    print(f"📎 Public URL: {file_url}")
     
-    # Remove leading/trailing underscores
-    clean_name = clean_name.strip('_')
+    # Save to database
+    doc = await save_document(
+        user_id=user_id,
+        filename=upload['filename'],
+        stored_filename=upload['stored_filename'],
+        file_path=file_url,
+        file_size=upload['file_size'],
+        mime_type=upload['mime_type'],
+        description=upload['fields'].get('description', ''),
+        content_sha256=upload.get('content_sha256')
+    )
+    await release_duplicates(user_id, [(upload, doc)])
+    print(f"✅ Document saved to database")
+    # Text extraction runs in the background, after the response
+    enqueue_extraction(doc)
+    return doc
+
+async def upload(request):
+    """Upload document to Supabase Storage, streaming the body in chunks"""
+    current_user = request.state.user
     
-    # Generate unique filename
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    safe_filename = f"{current_user.id}/{timestamp}_{clean_name}"
+    # Get user's access token for RLS
+    access_token = request.state.access_token
     
     try:
-        print(f"📤 Uploading file: {file.filename} ({len(content)} bytes)")
-        
-        # Create a Supabase client with the user's access token for RLS
-        user_supabase = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        user_supabase.auth.set_session(access_token, request.cookies.get('sb_refresh_token'))
-        
-        # Upload to Supabase Storage with proper error handling
-        try:
-            upload_response = user_supabase.storage.from_(STORAGE_BUCKET).upload(
-                path=safe_filename,
-                file=content,
-                file_options={
-                    "content-type": file.content_type or 'application/octet-stream',
-                    "upsert": "false"
-                }
-            )
-            print(f"✅ File uploaded to storage: {safe_filename}")
-            print(f"Upload response: {upload_response}")
-        except Exception as storage_error:
-            print(f"❌ Supabase Storage error: {storage_error}")
-            # If file already exists, try with a different name
-            if "already exists" in str(storage_error).lower():
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-                safe_filename = f"{current_user.id}/{timestamp}_{file.filename}"
-                upload_response = user_supabase.storage.from_(STORAGE_BUCKET).upload(
-                    path=safe_filename,
-                    file=content,
-                    file_options={"content-type": file.content_type or 'application/octet-stream'}
-                )
-            else:
-                raise
-        
-        # Get public URL
-        file_url = supabase_client.storage.from_(STORAGE_BUCKET).get_public_url(safe_filename)
-        print(f"📎 Public URL: {file_url}")
-        
-        # Save to database
-        await save_document(
-            user_id=current_user.id,
-            filename=file.filename,
-            stored_filename=safe_filename,
-            file_path=file_url,
-            file_size=len(content),
-            mime_type=file.content_type or 'application/octet-stream',
-            description=description
-        )
-        print(f"✅ Document saved to database")
+        # Validates type and size while forwarding chunks to storage
+        upload = await stream_upload(request, current_user.id, access_token)
+        await record_upload(current_user.id, upload)
         
         return RedirectResponse('/dashboard', status_code=303)
+    except UploadRejected as e:
+        return RedirectResponse(f'/dashboard?error={e.reason}', status_code=303)
     except Exception as e:
         error_msg = str(e).lower()
         print(f"❌ Error uploading file: {e}")
@@ -1609,72 +1845,293 @@ async def post(request):
         # Return specific error
         if "timeout" in error_msg or "timed out" in error_msg:
             return RedirectResponse('/dashboard?error=timeout', status_code=303)
-        elif "size" in error_msg or "large" in error_msg:
+        elif "size" in error_msg or "large" in error_msg or "413" in error_msg:
             return RedirectResponse('/dashboard?error=file_too_large', status_code=303)
         else:
             return RedirectResponse('/dashboard?error=upload_failed', status_code=303)
 
+# Plain Starlette route: FastHTML handlers parse (and buffer) the whole form first
+app.add_route(Route('/upload', upload, methods=['POST']))
+
+# Multi-file uploads (HTMX form): per-file status, one bulk insert
+BATCH_STATUS_MESSAGES = {
+    'ok': 'Subido',
+    'invalid_file': 'Tipo de archivo no permitido',
+    'file_too_large': 'Demasiado grande (máx. 50MB)',
+    'empty_file': 'Archivo vacío',
+    'too_many_files': 'Demasiados archivos en una sola subida',
+    'upload_failed': 'Error al subir',
+    'not_found': 'El archivo no llegó al almacenamiento',
+}
+
+def batch_results(results):
+    """Per-file status list shown under the upload form"""
+    uploaded = sum(1 for r in results if r['status'] == 'ok')
+    return Div(
+        *[Div(
+            I(cls='fas fa-check-circle text-brand mr-2' if r['status'] == 'ok' else 'fas fa-times-circle text-red-400 mr-2'),
+            Span(r['filename'], cls='text-white text-sm flex-1 min-w-0 truncate'),
+            Span(BATCH_STATUS_MESSAGES.get(r['status'], r['status']), cls='text-xs text-gray-400 ml-3'),
+            cls='flex items-center py-1'
+        ) for r in results],
+        A(
+            I(cls='fas fa-sync-alt mr-2'),
+            'Actualizar documentos',
+            href='/dashboard',
+            cls='inline-flex items-center text-brand hover:text-primary-dark text-sm font-semibold mt-3'
+        ) if uploaded else None,
+        cls='mt-6 bg-white/5 rounded-xl p-4 border border-white/10'
+    )
+
+async def upload_batch(request):
+    """Upload several documents: bounded parallel storage writes, one bulk insert"""
+    current_user = request.state.user
+    access_token = request.state.access_token
+    
+    try:
+        results, fields = await stream_batch_upload(request, current_user.id, access_token)
+    except UploadRejected as e:
+        results, fields = [{'filename': '', 'status': e.reason}], {}
+    
+    uploaded = [r for r in results if r['status'] == 'ok']
+    if uploaded:
+        await deduplicate_uploads(current_user.id, uploaded)
+        rows = [{
+            'filename': r['filename'],
+            'stored_filename': r['stored_filename'],
+            'file_path': await get_public_url(r['stored_filename']),
+            'file_size': r['file_size'],
+            'mime_type': r['mime_type'],
+            'description': fields.get('description', ''),
+            'content_sha256': r['content_sha256']
+        } for r in uploaded]
+        saved = await save_documents(current_user.id, rows)
+        if saved is None:
+            # Without rows the objects would be unreachable: clean them up
+            await remove_unreferenced_files([r['stored_filename'] for r in uploaded] + [r['fresh_copy'] for r in uploaded if 'fresh_copy' in r])
+            for r in uploaded:
+                r['status'] = 'upload_failed'
+        else:
+            # Rows come back in insert order
+            await release_duplicates(current_user.id, list(zip(uploaded, saved)))
+            print(f"✅ {len(saved)} documents saved to database")
+            for doc in saved:
+                enqueue_extraction(doc)
+    
+    if 'application/json' in request.headers.get('accept', ''):
+        return JSONResponse([{
+            'filename': r['filename'],
+            'status': r['status'],
+            'file_size': r.get('file_size', 0),
+            'stored_filename': r['stored_filename'] if r['status'] == 'ok' else None
+        } for r in results])
+    return HTMLResponse(to_xml(batch_results(results)))
+
+app.add_route(Route('/upload/batch', upload_batch, methods=['POST']))
+
+# Resumable uploads: create a session, PUT numbered chunks, check progress, finalize
+UPLOAD_ERROR_STATUS = {
+    'file_too_large': 413,
+    'incomplete_upload': 409,
+    'not_found': 404,
+}
+
+def upload_error(reason: str):
+    return JSONResponse({'error': reason}, status_code=UPLOAD_ERROR_STATUS.get(reason, 400))
+
+# Direct uploads: presign a path, the browser PUTs the file to storage, then
+# finalize verifies the object and writes the documents row
+@rt('/uploads/direct')
+async def post(request, filename: str, size: int):
+    """Presigned upload URL for one file"""
+    current_user = request.state.user
+    
+    await maybe_sweep_upload_sessions()
+    try:
+        return JSONResponse(await create_direct_upload(current_user.id, filename, size), status_code=201)
+    except UploadRejected as e:
+        return upload_error(e.reason)
+    except Exception as e:
+        print(f"❌ Error presigning upload: {e}")
+        return upload_error('upload_failed')
+
+@rt('/uploads/direct/finalize')
+async def post(request, stored_filename: str, filename: str, description: str = ''):
+    """Verify a directly uploaded object and create the document"""
+    current_user = request.state.user
+    
+    try:
+        upload = await verify_direct_upload(current_user.id, stored_filename, filename, description)
+        doc = await record_upload(current_user.id, upload)
+    except UploadRejected as e:
+        return upload_error(e.reason)
+    except Exception as e:
+        print(f"❌ Error finalizing direct upload {stored_filename}: {e}")
+        return upload_error('upload_failed')
+    return JSONResponse({'document_id': doc['id'] if doc else None, 'stored_filename': upload['stored_filename']}, status_code=201)
+
+@rt('/uploads')
+async def post(request, filename: str, size: int, mime_type: str = None, description: str = '', sha256: str = None):
+    """Open a resumable upload session.
+    A client-computed sha256 of content the user already stored skips the transfer."""
+    current_user = request.state.user
+    
+    await maybe_sweep_upload_sessions()
+    try:
+        session = await create_upload_session(current_user.id, filename, size, mime_type, description)
+    except UploadRejected as e:
+        return upload_error(e.reason)
+    
+    # Declared hashes are only trusted against the user's own files
+    if sha256 and DEDUP_SCOPE != 'off':
+        sha256 = sha256.lower()
+        stored = (await find_documents_by_hash([sha256], current_user.id)).get(sha256)
+        if stored:
+            # Size and type describe the stored bytes, never the client's claim
+            doc = await record_upload(current_user.id, {
+                'filename': filename,
+                'stored_filename': stored['stored_filename'],
+                'mime_type': stored['mime_type'],
+                'file_size': stored['file_size'],
+                'content_sha256': sha256,
+                'deduplicated': True,
+                'fields': {'description': description},
+            })
+            # No copy to fall back on: if the object was deleted concurrently,
+            # drop the row and let the client upload the content
+            if doc and await probe_file(stored['stored_filename']) is None:
+                await delete_document(doc['id'], current_user.id)
+                await remove_unreferenced_files([stored['stored_filename']])
+            else:
+                await discard_upload_session(session)
+                return JSONResponse({'document_id': doc['id'] if doc else None, 'stored_filename': stored['stored_filename'], 'deduplicated': True}, status_code=201)
+    return JSONResponse(await upload_progress(session), status_code=201)
+
+@rt('/uploads/{upload_id}')
+async def get(request, upload_id: str):
+    """Progress of a resumable upload (received and missing chunks)"""
+    current_user = request.state.user
+    
+    session = await get_upload_session(current_user.id, upload_id)
+    if not session:
+        return JSONResponse({'error': 'not_found'}, status_code=404)
+    return JSONResponse(await upload_progress(session))
+
+@rt('/uploads/{upload_id}')
+async def delete(request, upload_id: str):
+    """Abandon a resumable upload"""
+    current_user = request.state.user
+    
+    session = await get_upload_session(current_user.id, upload_id)
+    if session:
+        await discard_upload_session(session)
+    return Response(status_code=204)
+
+async def put_upload_chunk(request):
+    """Store one chunk; its byte offset comes from Upload-Offset or ?offset="""
+    current_user = request.state.user
+    
+    session = await get_upload_session(current_user.id, request.path_params['upload_id'])
+    if not session:
+        return JSONResponse({'error': 'not_found'}, status_code=404)
+    
+    offset = request.headers.get('upload-offset', request.query_params.get('offset', ''))
+    if not offset.isdigit():
+        return upload_error('invalid_chunk')
+    try:
+        await write_chunk(session, request.path_params['index'], int(offset), request.stream())
+    except UploadRejected as e:
+        return upload_error(e.reason)
+    return JSONResponse(await upload_progress(session))
+
+# Plain Starlette route so chunk bodies stream to storage, not buffered
+app.add_route(Route('/uploads/{upload_id}/chunks/{index:int}', put_upload_chunk, methods=['PUT']))
+
+@rt('/uploads/{upload_id}/finalize')
+async def post(request, upload_id: str):
+    """Assemble the chunks into storage and create the document"""
+    current_user = request.state.user
+    
+    session = await get_upload_session(current_user.id, upload_id)
+    if not session:
+        return JSONResponse({'error': 'not_found'}, status_code=404)
+    try:
+        upload = await finalize_upload_session(session, request.state.access_token)
+        doc = await record_upload(current_user.id, upload)
+    except UploadRejected as e:
+        return upload_error(e.reason)
+    except Exception as e:
+        print(f"❌ Error finalizing upload {upload_id}: {e}")
+        return upload_error('upload_failed')
+    return JSONResponse({'document_id': doc['id'] if doc else None, 'stored_filename': upload['stored_filename'], 'deduplicated': upload.get('deduplicated', False)}, status_code=201)
+
 @rt('/delete/{doc_id}')
 async def post(request, doc_id: str):
     """Delete document from Supabase Storage"""
-    current_user = get_current_user(request)
-    if not current_user:
-        return RedirectResponse('/login', status_code=303)
-    
-    documents = await get_user_documents(current_user.id)
+    current_user = request.state.user
     
-    # Find document
-    doc = next((d for d in documents if d['id'] == doc_id), None)
+    doc = await get_document(current_user.id, doc_id)
     if not doc:
         return RedirectResponse('/dashboard', status_code=303)
     
-    try:
-        # Delete file from Supabase Storage
-        supabase_client.storage.from_(STORAGE_BUCKET).remove([doc['stored_filename']])
-    except Exception as e:
-        print(f"Error deleting file from storage: {e}")
-    
     # Delete from database
-    from database import delete_document
-    await delete_document(doc_id)
+    await delete_document(doc_id, current_user.id)
+    
+    # Delete file from Supabase Storage once no other document references it
+    await remove_unreferenced_files([doc['stored_filename']])
     
     return RedirectResponse('/dashboard', status_code=303)
 
-@rt('/download/{doc_id}')
-async def get(request, doc_id: str):
-    """Download document from Supabase Storage"""
-    current_user = get_current_user(request)
-    if not current_user:
-        return RedirectResponse('/login', status_code=303)
+@rt('/delete')
+async def post(request, ids: list[str] = None):
+    """Delete several documents: one ownership query, batched storage and row deletes"""
+    current_user = request.state.user
     
-    documents = await get_user_documents(current_user.id)
+    if not ids:
+        return RedirectResponse('/dashboard', status_code=303)
+    
+    # Only ids owned by the current user survive this query
+    docs = await get_documents(current_user.id, set(ids))
+    if docs:
+        await delete_documents(current_user.id, [doc['id'] for doc in docs])
+        await remove_unreferenced_files([doc['stored_filename'] for doc in docs])
+        print(f"🗑️ Deleted {len(docs)} documents")
     
-    # Find document
-    doc = next((d for d in documents if d['id'] == doc_id), None)
+    return RedirectResponse('/dashboard', status_code=303)
+
+@rt('/download/{doc_id}')
+async def get(request, doc_id: str, inline: bool = False):
+    """Download document from Supabase Storage (inline=1 for the viewer)"""
+    current_user = request.state.user
+    
+    doc = await get_document(current_user.id, doc_id)
     if not doc:
         return RedirectResponse('/dashboard', status_code=303)
     
-    # Redirect to public URL (Supabase Storage)
-    return RedirectResponse(doc['file_path'], status_code=303)
+    if DOWNLOAD_MODE == 'redirect':
+        # Redirect to public URL (Supabase Storage)
+        return RedirectResponse(doc['file_path'], status_code=303)
+    
+    if DOWNLOAD_MODE == 'signed':
+        urls = await create_signed_urls([doc['stored_filename']])
+        if doc['stored_filename'] in urls:
+            url = urls[doc['stored_filename']]
+            if not inline:
+                url += f"&download={quote(doc['filename'])}"
+            return RedirectResponse(url, status_code=303)
+    
+    # Stream through the app: byte ranges for the PDF viewer, 304 on revalidation
+    return await stream_download(request, doc, inline=inline)
 
 @rt('/view/{doc_id}')
 async def get(request, doc_id: str):
     """View document (simple preview)"""
-    current_user = get_current_user(request)
-    if not current_user:
-        return RedirectResponse('/login', status_code=303)
-    
-    documents = await get_user_documents(current_user.id)
+    current_user = request.state.user
     
-    # Find document
-    doc = next((d for d in documents if d['id'] == doc_id), None)
+    doc = await get_document(current_user.id, doc_id)
     if not doc:
         return RedirectResponse('/dashboard', status_code=303)
     
-    file_path = Path(doc['file_path'])
-    if not file_path.exists():
-        return RedirectResponse('/dashboard?error=file_not_found', status_code=303)
-    
     # For PDFs, we can embed them
     if doc['mime_type'] == 'application/pdf':
         return Div(
@@ -1683,7 +2140,7 @@ async def get(request, doc_id: str):
                     A('← Volver al Dashboard', href='/dashboard', cls='bg-gray-700 hover:bg-gray-800 text-white px-6 py-3 rounded-lg font-semibold transition inline-block mb-6'),
                     H1(f"📄 {doc['filename']}", cls='text-3xl font-bold text-gray-800 mb-6'),
                     Div(
-                        Iframe(src=f"/download/{doc_id}", cls='w-full h-screen rounded-xl shadow-2xl border-4 border-gray-200'),
+                        Iframe(src=f"/download/{doc_id}?inline=1", cls='w-full h-screen rounded-xl shadow-2xl border-4 border-gray-200'),
                     ),
                     cls='max-w-7xl mx-auto px-4 py-8'
                 ),
@@ -1720,15 +2177,64 @@ async def get(request, doc_id: str):
 # Initialize database on startup
 @app.on_event("startup")
 async def startup():
-    await init_db()
+    with boot_phase('init_db'):
+        await init_db()
+    # Background cleanup of abandoned resumable uploads
+    app.state.upload_sweeper = asyncio.create_task(run_upload_sweeper())
+    # Post-upload text extraction (queue + process pool)
+    start_extraction_workers()
+    # Prerendered pages, /static index, Supabase connections and executor
+    # workers, all before the first request (see /ready)
+    with boot_phase('warmup'):
+        await start_warmup(app, BASE_URL)
+    finish_boot(APP_VERSION)
+
+# Release the shared Supabase connection pool
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_warmup(app)
+    app.state.upload_sweeper.cancel()
+    await stop_extraction_workers()
+    await close_clients()
+
+# Readiness: 503 until the startup warm-up has finished with every required
+# step (Supabase reachable); a degraded instance retries them from here
+@rt('/ready')
+async def get():
+    await retry_warmup()
+    ready = is_ready()
+    return JSONResponse(
+        {'ready': ready, **get_warmup_stats()},
+        status_code=200 if ready else 503,
+        headers={'Cache-Control': 'no-store', **({} if ready else {'Retry-After': '1'})},
+    )
+
+# Runtime counters (enabled outside production or with DEBUG_STATS=1)
+@rt('/debug/stats')
+def get():
+    if IS_PRODUCTION and not os.getenv("DEBUG_STATS"):
+        return Response(status_code=404)
+    return JSONResponse({
+        'auth': get_auth_stats(),
+        'cache': get_cache_stats(),
+        'clients': get_client_stats(),
+        'extraction': get_extraction_stats(),
+        'shells': get_shell_stats(),
+        'cards': card_cache.stats(),
+        'compression': get_compression_stats(),
+        'static': get_static_stats(),
+        'boot': get_boot_stats(),
+        'warmup': get_warmup_stats(),
+    })
 
 # Serve static files
 @rt('/static/{filepath:path}')
-def get(filepath: str):
-    return FileResponse(f'static/{filepath}')
+def get(request, filepath: str):
+    return serve_static(request, filepath)
 
 # Export app for Vercel
 handler = app
+mark_imported()
 
 if __name__ == '__main__':
     import uvicorn
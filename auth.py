@@ -0,0 +1,373 @@
+import os
+import time
+import asyncio
+import hashlib
+import jwt
+from dotenv import load_dotenv
+from starlette.requests import cookie_parser
+from starlette.responses import Response, JSONResponse, RedirectResponse
+from cache import TTLCache
+from database import get_auth_user, get_http_client, refresh_auth_session, document_cache, DOCUMENT_CACHE_TTL
+
+# Load environment variables
+load_dotenv()
+
+# JWT verification configuration
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+JWKS_URL = f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None
+JWKS_REFRESH_INTERVAL = int(os.getenv("JWKS_REFRESH_INTERVAL", "600"))  # seconds
+
+# Verified tokens are cached by hash, never by the raw token
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "300"))  # seconds
+
+ASYMMETRIC_ALGORITHMS = {'RS256', 'ES256', 'EdDSA'}
+
+# Session cookies; access tokens within TOKEN_REFRESH_MARGIN seconds of expiry
+# are refreshed by TokenRefreshMiddleware before the request reaches a route
+ACCESS_COOKIE = 'sb_access_token'
+REFRESH_COOKIE = 'sb_refresh_token'
+REFRESH_COOKIE_MAX_AGE = 7 * 24 * 60 * 60  # 7 days
+# Version of the user's document cache after an upload or delete, so the next
+# request invalidates it on whichever worker it reaches; older entries expire
+# on their own after DOCUMENT_CACHE_TTL
+DOCS_VERSION_COOKIE = 'docs_version'
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", "60"))  # seconds
+# Supabase rotates refresh tokens; a refreshed session is handed to requests
+# that still carry the old token for this long
+REFRESH_RESULT_TTL = int(os.getenv("REFRESH_RESULT_TTL", "60"))  # seconds
+REFRESH_SKIP_PATHS = ('/static/', '/logout')
+# Responses that carry refreshed session cookies
+SESSION_CACHE_CONTROL = "private, no-store"
+
+_token_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+_jwks = {}
+_jwks_fetched_at = 0.0
+_jwks_refresh = None
+_refreshed_sessions = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=REFRESH_RESULT_TTL)
+_refreshes_in_flight = {}
+
+# Time spent resolving the user, per top-level path ('/dashboard', '/uploads', ...)
+request_auth_stats = {}
+
+auth_stats = {
+    'hits': 0,
+    'misses': 0,
+    'local_verifications': 0,
+    'remote_calls': 0,
+    'rejected': 0,
+    'refreshes': 0,
+    'refresh_joined': 0,
+    'refresh_failures': 0,
+}
+
+
+class TokenUser:
+    """User resolved from verified JWT claims (mirrors the fields routes read from Supabase's User)"""
+
+    __slots__ = ('id', 'email', 'role', 'user_metadata', 'app_metadata', 'expires_at')
+
+    def __init__(self, claims: dict):
+        self.id = claims['sub']
+        self.email = claims.get('email')
+        self.role = claims.get('role')
+        self.user_metadata = claims.get('user_metadata') or {}
+        self.app_metadata = claims.get('app_metadata') or {}
+        self.expires_at = claims.get('exp')
+
+
+def _token_key(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+
+def _remaining_lifetime(access_token: str) -> float:
+    """Seconds until the token's exp claim (signature not checked)"""
+    try:
+        exp = jwt.decode(access_token, options={"verify_signature": False}).get('exp')
+    except jwt.PyJWTError:
+        return 0
+    return exp - time.time() if exp else AUTH_CACHE_TTL
+
+
+def _signing_key(header: dict):
+    """Return the key for a token header, or None when the key is unknown locally"""
+    alg = header.get('alg')
+    if alg == 'HS256':
+        return SUPABASE_JWT_SECRET
+    if alg in ASYMMETRIC_ALGORITHMS:
+        return _jwks.get(header.get('kid'))
+    return None
+
+
+async def refresh_jwks():
+    """Reload the project's JWKS, at most once per JWKS_REFRESH_INTERVAL"""
+    global _jwks, _jwks_fetched_at
+    if not JWKS_URL or time.monotonic() - _jwks_fetched_at < JWKS_REFRESH_INTERVAL:
+        return
+    _jwks_fetched_at = time.monotonic()
+    try:
+        response = await get_http_client().get(JWKS_URL)
+        response.raise_for_status()
+        jwk_set = jwt.PyJWKSet.from_dict(response.json())
+        _jwks = {key.key_id: key for key in jwk_set.keys if key.key_id}
+    except Exception as e:
+        print(f"Error fetching JWKS: {e}")
+
+
+def _schedule_jwks_refresh():
+    global _jwks_refresh
+    if _jwks_refresh is None or _jwks_refresh.done():
+        _jwks_refresh = asyncio.create_task(refresh_jwks())
+
+
+async def verify_access_token(access_token: str):
+    """Resolve an access token to a user: cache, then local JWT check, then Supabase Auth"""
+    key = _token_key(access_token)
+    user = _token_cache.get(key)
+    if user is not None:
+        auth_stats['hits'] += 1
+        return user
+    auth_stats['misses'] += 1
+
+    try:
+        header = jwt.get_unverified_header(access_token)
+    except jwt.PyJWTError:
+        auth_stats['rejected'] += 1
+        return None
+
+    signing_key = _signing_key(header)
+    if signing_key is not None:
+        try:
+            claims = jwt.decode(
+                access_token,
+                signing_key,
+                algorithms=[header['alg']],
+                audience=JWT_AUDIENCE,
+                options={"require": ["exp", "sub"]},
+            )
+        except jwt.PyJWTError:
+            # Bad signature or expired token - no point asking Supabase
+            auth_stats['rejected'] += 1
+            return None
+        auth_stats['local_verifications'] += 1
+        user = TokenUser(claims)
+        _token_cache.set(key, user, ttl=min(AUTH_CACHE_TTL, claims['exp'] - time.time()))
+        return user
+
+    # Unknown key: let Supabase decide, and pick up rotated keys for next time
+    if header.get('alg') in ASYMMETRIC_ALGORITHMS:
+        _schedule_jwks_refresh()
+    auth_stats['remote_calls'] += 1
+    user = await get_auth_user(access_token)
+    if user is None:
+        auth_stats['rejected'] += 1
+        return None
+    _token_cache.set(key, user, ttl=min(AUTH_CACHE_TTL, _remaining_lifetime(access_token)))
+    return user
+
+
+def forget_access_token(access_token: str):
+    """Drop a token from the cache (logout)"""
+    _token_cache.pop(_token_key(access_token))
+
+
+def set_session_cookies(response, session: dict):
+    """Write the Supabase session cookies (login and transparent refresh)"""
+    response.set_cookie(
+        key=ACCESS_COOKIE,
+        value=session['access_token'],
+        httponly=True,
+        max_age=session['expires_in'],
+        secure=True,
+        samesite='lax'
+    )
+    response.set_cookie(
+        key=REFRESH_COOKIE,
+        value=session['refresh_token'],
+        httponly=True,
+        max_age=REFRESH_COOKIE_MAX_AGE,
+        secure=True,
+        samesite='lax'
+    )
+
+
+def _needs_refresh(access_token: str) -> bool:
+    return not access_token or _remaining_lifetime(access_token) < TOKEN_REFRESH_MARGIN
+
+
+async def _refresh(refresh_token: str, key: str):
+    try:
+        session = await refresh_auth_session(refresh_token)
+        auth_stats['refreshes'] += 1
+        if session is None:
+            auth_stats['refresh_failures'] += 1
+        _refreshed_sessions.set(key, session or {})
+        return session
+    except Exception as e:
+        # Network trouble: keep the cookies and try again on a later request
+        print(f"Error refreshing session: {e}")
+        auth_stats['refresh_failures'] += 1
+        raise
+    finally:
+        _refreshes_in_flight.pop(key, None)
+
+
+async def refresh_session(refresh_token: str):
+    """Single-flight refresh: concurrent (and shortly later) requests carrying
+    the same refresh token share one call. Returns the new session dict,
+    {} when the refresh token was rejected, or None on transient errors."""
+    key = _token_key(refresh_token)
+    session = _refreshed_sessions.get(key)
+    if session is not None:
+        auth_stats['refresh_joined'] += 1
+        return session
+    task = _refreshes_in_flight.get(key)
+    if task is None:
+        task = _refreshes_in_flight[key] = asyncio.ensure_future(_refresh(refresh_token, key))
+    else:
+        auth_stats['refresh_joined'] += 1
+    try:
+        return (await asyncio.shield(task)) or {}
+    except Exception:
+        return None
+
+
+class TokenRefreshMiddleware:
+    """Refresh an expired or near-expiry access token from the refresh cookie
+    before routing, expose the new token to the request and rewrite the
+    cookies on the response"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'].startswith(REFRESH_SKIP_PATHS):
+            return await self.app(scope, receive, send)
+        headers = dict(scope['headers'])
+        cookies = cookie_parser(headers.get(b'cookie', b'').decode('latin-1'))
+        refresh_token = cookies.get(REFRESH_COOKIE)
+        if not refresh_token or not _needs_refresh(cookies.get(ACCESS_COOKIE)):
+            return await self.app(scope, receive, send)
+
+        session = await refresh_session(refresh_token)
+        if session is None:
+            return await self.app(scope, receive, send)
+
+        cookie_response = Response()
+        if session:
+            set_session_cookies(cookie_response, session)
+            cookies[ACCESS_COOKIE] = session['access_token']
+            cookies[REFRESH_COOKIE] = session['refresh_token']
+        else:
+            # Refresh token revoked or already used: end the session
+            cookie_response.delete_cookie(ACCESS_COOKIE)
+            cookie_response.delete_cookie(REFRESH_COOKIE)
+            cookies.pop(ACCESS_COOKIE, None)
+            cookies.pop(REFRESH_COOKIE, None)
+        set_cookies = [(k, v) for k, v in cookie_response.raw_headers if k == b'set-cookie']
+
+        # Routes read the refreshed token from the request cookies as usual
+        cookie_header = '; '.join(f'{name}={value}' for name, value in cookies.items()).encode('latin-1')
+        scope = {**scope, 'headers': [(k, v) for k, v in scope['headers'] if k != b'cookie'] + [(b'cookie', cookie_header)]}
+
+        async def send_with_cookies(message):
+            if message['type'] == 'http.response.start':
+                response_headers = message.get('headers', [])
+                # A route that sets its own session (login) takes precedence
+                if not any(k == b'set-cookie' and v.startswith(ACCESS_COOKIE.encode()) for k, v in response_headers):
+                    # Session cookies on a possibly cacheable response (e.g. a
+                    # public prerendered page): keep it out of every cache
+                    response_headers = [(k, v) for k, v in response_headers if k != b'cache-control']
+                    message = {**message, 'headers': [*response_headers, (b'cache-control', SESSION_CACHE_CONTROL.encode()), *set_cookies]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookies)
+
+
+def _record_auth_time(path: str, elapsed_ms: float):
+    section = '/' + path.strip('/').split('/', 1)[0]
+    stats = request_auth_stats.setdefault(section, {'requests': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+    stats['requests'] += 1
+    stats['total_ms'] += elapsed_ms
+    stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+
+def _unauthenticated(scope, headers: dict):
+    """Same answers the routes used to give: HX-Redirect for HTMX, 401 for the
+    JSON upload API, a login redirect for pages"""
+    if b'hx-request' in headers:
+        return Response(status_code=204, headers={'HX-Redirect': '/login'})
+    if scope['path'].startswith('/uploads') or b'application/json' in headers.get(b'accept', b''):
+        return JSONResponse({'error': 'unauthorized'}, status_code=401)
+    return RedirectResponse('/login', status_code=303)
+
+
+class RequestAuthMiddleware:
+    """Resolve the user once per request for protected paths: sets
+    request.state.user and request.state.access_token, rejects anonymous
+    requests before any handler code (or body parsing) runs and reports the
+    time spent in a Server-Timing header and in the auth stats"""
+
+    def __init__(self, app, protected=()):
+        self.app = app
+        self.protected = tuple(protected)
+
+    def _is_protected(self, path: str) -> bool:
+        return any(path == prefix or path.startswith(prefix + '/') for prefix in self.protected)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self._is_protected(scope['path']):
+            return await self.app(scope, receive, send)
+        headers = dict(scope['headers'])
+        cookies = cookie_parser(headers.get(b'cookie', b'').decode('latin-1'))
+        access_token = cookies.get(ACCESS_COOKIE)
+
+        started = time.perf_counter()
+        user = await verify_access_token(access_token) if access_token else None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _record_auth_time(scope['path'], elapsed_ms)
+
+        if user is None:
+            return await _unauthenticated(scope, headers)(scope, receive, send)
+        state = scope.setdefault('state', {})
+        state['user'] = user
+        state['access_token'] = access_token
+        state['auth_ms'] = elapsed_ms
+        timing = (b'server-timing', f'auth;dur={elapsed_ms:.2f}'.encode())
+        seen_version = cookies.get(DOCS_VERSION_COOKIE, '')
+        if seen_version.isdigit():
+            document_cache.observe(user.id, int(seen_version))
+        version = document_cache.version(user.id)
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                extra = [timing]
+                current = document_cache.version(user.id)
+                if current != version:
+                    # The handler changed the user's documents: tell other workers
+                    cookie_response = Response()
+                    cookie_response.set_cookie(DOCS_VERSION_COOKIE, str(current), max_age=DOCUMENT_CACHE_TTL,
+                                               httponly=True, secure=True, samesite='lax')
+                    extra.extend((k, v) for k, v in cookie_response.raw_headers if k == b'set-cookie')
+                message = {**message, 'headers': [*message.get('headers', []), *extra]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
+
+
+def get_auth_stats() -> dict:
+    """Hit/miss counters for the token verification layer"""
+    return {
+        **auth_stats,
+        'cache': _token_cache.stats(),
+        'requests': {
+            section: {
+                'requests': stats['requests'],
+                'avg_ms': round(stats['total_ms'] / stats['requests'], 3),
+                'max_ms': round(stats['max_ms'], 3),
+            }
+            for section, stats in request_auth_stats.items()
+        },
+    }
@@ -0,0 +1,67 @@
+"""Dashboard card rendering: full FastHTML trees vs. memoized fragments.
+
+Usage: python benchmarks/dashboard_cards.py [sizes...]   (default 100 1000 10000)
+No Supabase connection is needed; documents are synthetic.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark")
+os.environ.setdefault("CARD_CACHE_SIZE", "100000")
+
+from fasthtml.common import Div, to_xml
+import app
+
+MIME_TYPES = [
+    'application/pdf',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+]
+
+
+def make_documents(n: int) -> list:
+    return [{
+        'id': f'00000000-0000-0000-0000-{i:012d}',
+        'filename': f'Documento de prueba {i}.pdf',
+        'description': 'Descripción del documento número %d con algo de texto' % i,
+        'uploaded_at': '2026-03-%02dT10:00:00+00:00' % (i % 28 + 1),
+        'file_size': 1024 * (i % 5000 + 1),
+        'mime_type': MIME_TYPES[i % 3],
+        'stored_filename': f'user/20260301_100000_{i}.pdf',
+    } for i in range(n)]
+
+
+def render(documents, card) -> str:
+    grouped = app.group_documents(documents)
+    return to_xml(Div(*[
+        Div(*[card(doc, category) for doc in grouped[category]], id=f'doc-list-{category}')
+        for _, category in app.DOCUMENT_CATEGORIES
+    ]))
+
+
+def timed(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main(sizes):
+    print(f"{'docs':>7} {'tree (ms)':>11} {'cold cache (ms)':>16} {'warm cache (ms)':>16} {'speedup':>8}")
+    for n in sizes:
+        documents = make_documents(n)
+        repeat = 5 if n <= 1000 else 2
+        tree = timed(lambda: render(documents, app.document_card), repeat)
+        app.card_cache.clear()
+        cold = timed(lambda: render(documents, app.cached_card), 1)
+        warm = timed(lambda: render(documents, app.cached_card), repeat)
+        print(f"{n:>7} {tree:>11.1f} {cold:>16.1f} {warm:>16.1f} {tree / warm:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000])
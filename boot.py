@@ -0,0 +1,64 @@
+# Cold-start accounting. Imported first by app.py (standard library only) so
+# the clock starts before fasthtml and the Supabase SDK are loaded.
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+_started = time.perf_counter()
+
+
+def _process_age_ms():
+    """Time the process existed before this import (interpreter and runtime
+    bootstrap), from /proc on Linux; None elsewhere"""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round((uptime - start_ticks / os.sysconf('SC_CLK_TCK')) * 1000, 1)
+
+
+boot_stats = {
+    'process_age_ms': _process_age_ms(),
+    'phases': {},
+    'import_ms': None,
+    'startup_ms': None,
+    'modules': None,
+}
+
+
+@contextmanager
+def boot_phase(name: str):
+    """Time one import group or startup step; like -X importtime, also count
+    the modules it loaded"""
+    loaded = len(sys.modules)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        boot_stats['phases'][name] = {
+            'ms': round((time.perf_counter() - start) * 1000, 1),
+            'modules': len(sys.modules) - loaded,
+        }
+
+
+def mark_imported():
+    """End of app.py: the module is importable and routes are registered"""
+    boot_stats['import_ms'] = round((time.perf_counter() - _started) * 1000, 1)
+    boot_stats['modules'] = len(sys.modules)
+
+
+def finish_boot(version: str):
+    """End of the startup hook: log the breakdown once per process"""
+    boot_stats['startup_ms'] = round((time.perf_counter() - _started) * 1000, 1)
+    boot_stats['version'] = version
+    phases = ', '.join(f"{name} {phase['ms']:.0f}" for name, phase in boot_stats['phases'].items())
+    print(f"🚀 Cold start {boot_stats['startup_ms']:.0f} ms ({version}): import {boot_stats['import_ms']:.0f} ms, "
+          f"{boot_stats['modules']} modules [{phases}]")
+
+
+def get_boot_stats() -> dict:
+    return boot_stats
@@ -0,0 +1,480 @@
+"""Build the site stylesheet: the Tailwind utilities the templates use, nothing else.
+
+Scans the sources for class names the same way Tailwind's content scanner
+does (every token that compiles to a utility is kept), writes a minified,
+content-hashed file to static/css/ and records its name in
+static/manifest.json, which app.py reads at import time.
+
+    python build_css.py          # rebuild after changing classes
+    python build_css.py --check  # exit 1 if the committed CSS is stale
+
+Precompressed .gz (and .br when brotli is installed) siblings are written
+next to the stylesheet; static_files.py serves them to clients that accept
+the encoding.
+"""
+import re
+import sys
+import gzip
+import json
+import hashlib
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # optional: gzip sibling only
+    brotli = None
+
+ROOT = Path(__file__).resolve().parent
+SOURCES = ('app.py',)
+CSS_DIR = ROOT / 'static' / 'css'
+MANIFEST = ROOT / 'static' / 'manifest.json'
+ASSET_NAME = 'css/app.css'
+
+# Theme: the former in-browser tailwind.config plus the default palette for
+# the colour families in use
+FONT_SANS = "Outfit, sans-serif"
+FONT_MONO = 'ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Liberation Mono", "Courier New", monospace'
+
+_SHADES = (50, 100, 200, 300, 400, 500, 600, 700, 800, 900)
+_PALETTE = {
+    'slate': 'f8fafc f1f5f9 e2e8f0 cbd5e1 94a3b8 64748b 475569 334155 1e293b 0f172a',
+    'gray': 'f9fafb f3f4f6 e5e7eb d1d5db 9ca3af 6b7280 4b5563 374151 1f2937 111827',
+    'red': 'fef2f2 fee2e2 fecaca fca5a5 f87171 ef4444 dc2626 b91c1c 991b1b 7f1d1d',
+    'orange': 'fff7ed ffedd5 fed7aa fdba74 fb923c f97316 ea580c c2410c 9a3412 7c2d12',
+    'yellow': 'fefce8 fef9c3 fef08a fde047 facc15 eab308 ca8a04 a16207 854d0e 713f12',
+    'green': 'f0fdf4 dcfce7 bbf7d0 86efac 4ade80 22c55e 16a34a 15803d 166534 14532d',
+    'blue': 'eff6ff dbeafe bfdbfe 93c5fd 60a5fa 3b82f6 2563eb 1d4ed8 1e40af 1e3a8a',
+    'indigo': 'eef2ff e0e7ff c7d2fe a5b4fc 818cf8 6366f1 4f46e5 4338ca 3730a3 312e81',
+    'purple': 'faf5ff f3e8ff e9d5ff d8b4fe c084fc a855f7 9333ea 7e22ce 6b21a8 581c87',
+}
+COLORS = {
+    'white': 'ffffff',
+    'black': '000000',
+    'brand': '34B27B',
+    'brand-dark': '11181C',
+    'brand-light': 'F8F9FA',
+    'primary': '34B27B',
+    'primary-dark': '2A9063',
+    **{f'{family}-{shade}': hex_ for family, values in _PALETTE.items() for shade, hex_ in zip(_SHADES, values.split())},
+}
+
+SPACING = {'0': '0px', 'px': '1px', **{
+    str(n).removesuffix('.0'): f'{n / 4:g}rem' for n in (0.5, 1, 1.5, 2, 2.5, 3, 3.5, *range(4, 13), 14, 16, 20, 24, 28, 32, 36, 40, 44, 48, 52, 56, 60, 64, 72, 80, 96)
+}}
+SIZES = {**SPACING, 'full': '100%', 'auto': 'auto', '1/2': '50%', '1/3': '33.333333%', '2/3': '66.666667%', '1/4': '25%', '3/4': '75%'}
+FONT_SIZES = {
+    'xs': ('0.75rem', '1rem'), 'sm': ('0.875rem', '1.25rem'), 'base': ('1rem', '1.5rem'),
+    'lg': ('1.125rem', '1.75rem'), 'xl': ('1.25rem', '1.75rem'), '2xl': ('1.5rem', '2rem'),
+    '3xl': ('1.875rem', '2.25rem'), '4xl': ('2.25rem', '2.5rem'), '5xl': ('3rem', '1'),
+    '6xl': ('3.75rem', '1'), '7xl': ('4.5rem', '1'), '8xl': ('6rem', '1'), '9xl': ('8rem', '1'),
+}
+FONT_WEIGHTS = {'light': 300, 'normal': 400, 'medium': 500, 'semibold': 600, 'bold': 700, 'extrabold': 800}
+MAX_WIDTHS = {
+    'xs': '20rem', 'sm': '24rem', 'md': '28rem', 'lg': '32rem', 'xl': '36rem', '2xl': '42rem', '3xl': '48rem',
+    '4xl': '56rem', '5xl': '64rem', '6xl': '72rem', '7xl': '80rem', 'full': '100%', 'none': 'none',
+}
+RADII = {'none': '0px', 'sm': '0.125rem', '': '0.25rem', 'md': '0.375rem', 'lg': '0.5rem', 'xl': '0.75rem', '2xl': '1rem', '3xl': '1.5rem', 'full': '9999px'}
+SHADOWS = {
+    'sm': '0 1px 2px 0 {c}',
+    '': '0 1px 3px 0 {c}, 0 1px 2px -1px {c}',
+    'md': '0 4px 6px -1px {c}, 0 2px 4px -2px {c}',
+    'lg': '0 10px 15px -3px {c}, 0 4px 6px -4px {c}',
+    'xl': '0 20px 25px -5px {c}, 0 8px 10px -6px {c}',
+    '2xl': '0 25px 50px -12px {c}',
+}
+SHADOW_ALPHA = {'2xl': '0.25', 'sm': '0.05'}
+BLURS = {'sm': '4px', '': '8px', 'md': '12px', 'lg': '16px', 'xl': '24px', '2xl': '40px', '3xl': '64px'}
+BREAKPOINTS = {'sm': '640px', 'md': '768px', 'lg': '1024px', 'xl': '1280px', '2xl': '1536px'}
+PSEUDO_VARIANTS = {'hover': ':hover', 'focus': ':focus', 'focus-within': ':focus-within', 'active': ':active', 'disabled': ':disabled'}
+
+TRANSFORM = ('translate(var(--tw-translate-x), var(--tw-translate-y)) rotate(var(--tw-rotate)) '
+             'skewX(var(--tw-skew-x)) skewY(var(--tw-skew-y)) scaleX(var(--tw-scale-x)) scaleY(var(--tw-scale-y))')
+TRANSITION_PROPERTIES = {
+    '': 'color, background-color, border-color, text-decoration-color, fill, stroke, opacity, box-shadow, transform, filter, backdrop-filter',
+    'all': 'all',
+    'colors': 'color, background-color, border-color, text-decoration-color, fill, stroke',
+    'opacity': 'opacity',
+    'shadow': 'box-shadow',
+    'transform': 'transform',
+}
+KEYFRAMES = {
+    'spin': 'to{transform:rotate(360deg)}',
+    'ping': '75%,100%{transform:scale(2);opacity:0}',
+    'pulse': '50%{opacity:.5}',
+    'bounce': ('0%,100%{transform:translateY(-25%);animation-timing-function:cubic-bezier(0.8,0,1,1)}'
+               '50%{transform:none;animation-timing-function:cubic-bezier(0,0,0.2,1)}'),
+}
+ANIMATIONS = {
+    'spin': 'spin 1s linear infinite',
+    'ping': 'ping 1s cubic-bezier(0, 0, 0.2, 1) infinite',
+    'pulse': 'pulse 2s cubic-bezier(0.4, 0, 0.6, 1) infinite',
+    'bounce': 'bounce 1s infinite',
+}
+
+# Tailwind v3 preflight (condensed) and the per-element variable defaults
+PREFLIGHT = f"""
+*,::before,::after{{box-sizing:border-box;border-width:0;border-style:solid;border-color:#e5e7eb}}
+::before,::after{{--tw-content:''}}
+html,:host{{line-height:1.5;-webkit-text-size-adjust:100%;-moz-tab-size:4;tab-size:4;font-family:{FONT_SANS};-webkit-tap-highlight-color:transparent}}
+body{{margin:0;line-height:inherit}}
+hr{{height:0;color:inherit;border-top-width:1px}}
+h1,h2,h3,h4,h5,h6{{font-size:inherit;font-weight:inherit}}
+a{{color:inherit;text-decoration:inherit}}
+b,strong{{font-weight:bolder}}
+code,kbd,samp,pre{{font-family:{FONT_MONO};font-size:1em}}
+small{{font-size:80%}}
+sub,sup{{font-size:75%;line-height:0;position:relative;vertical-align:baseline}}
+sub{{bottom:-0.25em}}
+sup{{top:-0.5em}}
+table{{text-indent:0;border-color:inherit;border-collapse:collapse}}
+button,input,optgroup,select,textarea{{font-family:inherit;font-feature-settings:inherit;font-variation-settings:inherit;font-size:100%;font-weight:inherit;line-height:inherit;letter-spacing:inherit;color:inherit;margin:0;padding:0}}
+button,select{{text-transform:none}}
+button,input:where([type='button']),input:where([type='reset']),input:where([type='submit']){{-webkit-appearance:button;background-color:transparent;background-image:none}}
+:-moz-focusring{{outline:auto}}
+:-moz-ui-invalid{{box-shadow:none}}
+progress{{vertical-align:baseline}}
+::-webkit-inner-spin-button,::-webkit-outer-spin-button{{height:auto}}
+[type='search']{{-webkit-appearance:textfield;outline-offset:-2px}}
+::-webkit-search-decoration{{-webkit-appearance:none}}
+::-webkit-file-upload-button{{-webkit-appearance:button;font:inherit}}
+summary{{display:list-item}}
+blockquote,dl,dd,h1,h2,h3,h4,h5,h6,hr,figure,p,pre{{margin:0}}
+fieldset{{margin:0;padding:0}}
+legend{{padding:0}}
+ol,ul,menu{{list-style:none;margin:0;padding:0}}
+dialog{{padding:0}}
+textarea{{resize:vertical}}
+input::placeholder,textarea::placeholder{{opacity:1;color:#9ca3af}}
+button,[role="button"]{{cursor:pointer}}
+:disabled{{cursor:default}}
+img,svg,video,canvas,audio,iframe,embed,object{{display:block;vertical-align:middle}}
+img,video{{max-width:100%;height:auto}}
+[hidden]{{display:none}}
+*,::before,::after,::backdrop{{--tw-translate-x:0;--tw-translate-y:0;--tw-rotate:0;--tw-skew-x:0;--tw-skew-y:0;--tw-scale-x:1;--tw-scale-y:1;--tw-ring-inset: ;--tw-ring-offset-width:0px;--tw-ring-offset-color:#fff;--tw-ring-color:rgb(59 130 246 / 0.5);--tw-ring-offset-shadow:0 0 #0000;--tw-ring-shadow:0 0 #0000;--tw-shadow:0 0 #0000;--tw-shadow-colored:0 0 #0000}}
+"""
+
+_TOKEN_RE = re.compile(r"[^\s'\"`<>={}\\]+")
+_CLASS_ATTR_RE = re.compile(r"""(?:cls\s*=\s*f?|class(?:Name)?\s*=\s*\\?)(['"])(.*?)\1""", re.S)
+
+
+def _rgb(name: str, alpha=None):
+    """'brand' or 'brand/30' -> CSS colour, None if unknown"""
+    if name == 'transparent':
+        return 'transparent'
+    if name == 'current':
+        return 'currentColor'
+    if '/' in name:
+        name, alpha = name.split('/', 1)
+        alpha = f'{int(alpha) / 100:g}' if alpha.isdigit() else None
+    hex_ = COLORS.get(name)
+    if hex_ is None:
+        return None
+    r, g, b = (int(hex_[i:i + 2], 16) for i in (0, 2, 4))
+    return f'rgb({r} {g} {b} / {alpha})' if alpha is not None else f'rgb({r} {g} {b})'
+
+
+def _arbitrary(value: str):
+    if value.startswith('[') and value.endswith(']'):
+        return value[1:-1].replace('_', ' ')
+    return None
+
+
+def _lookup(scale: dict, key: str):
+    return _arbitrary(key) or scale.get(key)
+
+
+def _spacing(prefix: str, properties, key: str, negative: bool):
+    value = _lookup(SPACING, key)
+    if value is None:
+        return None
+    if negative:
+        value = f'-{value}'
+    return {prop: value for prop in properties}
+
+
+_SPACING_PROPS = {
+    'p': ('padding',), 'px': ('padding-left', 'padding-right'), 'py': ('padding-top', 'padding-bottom'),
+    'pt': ('padding-top',), 'pr': ('padding-right',), 'pb': ('padding-bottom',), 'pl': ('padding-left',),
+    'm': ('margin',), 'mx': ('margin-left', 'margin-right'), 'my': ('margin-top', 'margin-bottom'),
+    'mt': ('margin-top',), 'mr': ('margin-right',), 'mb': ('margin-bottom',), 'ml': ('margin-left',),
+    'inset': ('inset',), 'inset-x': ('left', 'right'), 'inset-y': ('top', 'bottom'),
+    'top': ('top',), 'right': ('right',), 'bottom': ('bottom',), 'left': ('left',),
+    'gap': ('gap',), 'gap-x': ('column-gap',), 'gap-y': ('row-gap',),
+}
+_STATIC = {
+    'block': {'display': 'block'}, 'inline-block': {'display': 'inline-block'}, 'inline': {'display': 'inline'},
+    'flex': {'display': 'flex'}, 'inline-flex': {'display': 'inline-flex'}, 'grid': {'display': 'grid'},
+    'hidden': {'display': 'none'},
+    'static': {'position': 'static'}, 'fixed': {'position': 'fixed'}, 'absolute': {'position': 'absolute'},
+    'relative': {'position': 'relative'}, 'sticky': {'position': 'sticky'},
+    'flex-1': {'flex': '1 1 0%'}, 'flex-auto': {'flex': '1 1 auto'}, 'flex-none': {'flex': 'none'},
+    'flex-row': {'flex-direction': 'row'}, 'flex-col': {'flex-direction': 'column'},
+    'flex-wrap': {'flex-wrap': 'wrap'}, 'shrink-0': {'flex-shrink': '0'}, 'grow': {'flex-grow': '1'},
+    'items-start': {'align-items': 'flex-start'}, 'items-center': {'align-items': 'center'}, 'items-end': {'align-items': 'flex-end'},
+    'justify-start': {'justify-content': 'flex-start'}, 'justify-center': {'justify-content': 'center'},
+    'justify-end': {'justify-content': 'flex-end'}, 'justify-between': {'justify-content': 'space-between'},
+    'overflow-hidden': {'overflow': 'hidden'}, 'overflow-auto': {'overflow': 'auto'},
+    'truncate': {'overflow': 'hidden', 'text-overflow': 'ellipsis', 'white-space': 'nowrap'},
+    'pointer-events-none': {'pointer-events': 'none'}, 'cursor-pointer': {'cursor': 'pointer'},
+    'resize-none': {'resize': 'none'},
+    'text-left': {'text-align': 'left'}, 'text-center': {'text-align': 'center'}, 'text-right': {'text-align': 'right'},
+    'font-sans': {'font-family': FONT_SANS}, 'font-mono': {'font-family': FONT_MONO},
+    'tracking-tight': {'letter-spacing': '-0.025em'}, 'tracking-wide': {'letter-spacing': '0.025em'},
+    'uppercase': {'text-transform': 'uppercase'}, 'underline': {'text-decoration-line': 'underline'},
+    'break-all': {'word-break': 'break-all'}, 'whitespace-nowrap': {'white-space': 'nowrap'},
+    'border-solid': {'border-style': 'solid'}, 'border-dashed': {'border-style': 'dashed'},
+    'outline-none': {'outline': '2px solid transparent', 'outline-offset': '2px'},
+    'transform': {'transform': TRANSFORM},
+    'bg-gradient-to-r': {'background-image': 'linear-gradient(to right, var(--tw-gradient-stops))'},
+    'bg-gradient-to-b': {'background-image': 'linear-gradient(to bottom, var(--tw-gradient-stops))'},
+    'bg-gradient-to-br': {'background-image': 'linear-gradient(to bottom right, var(--tw-gradient-stops))'},
+    'min-h-screen': {'min-height': '100vh'}, 'h-screen': {'height': '100vh'},
+    'mx-auto': {'margin-left': 'auto', 'margin-right': 'auto'}, 'ml-auto': {'margin-left': 'auto'},
+    'mr-auto': {'margin-right': 'auto'},
+    'opacity-0': {'opacity': '0'}, 'opacity-50': {'opacity': '0.5'}, 'opacity-100': {'opacity': '1'},
+}
+for _n in range(1, 7):
+    _STATIC[f'line-clamp-{_n}'] = {'overflow': 'hidden', 'display': '-webkit-box', '-webkit-box-orient': 'vertical', '-webkit-line-clamp': str(_n)}
+
+
+def utility(name: str):
+    """(plugin, declarations, selector suffix) for one utility class without
+    variants, or None when it is not a utility. plugin orders the output the
+    way Tailwind does, so e.g. to-* stops override from-*."""
+    negative = name.startswith('-')
+    base = name[1:] if negative else name
+
+    if name in _STATIC:
+        return 'static', _STATIC[name], ''
+
+    prefix, _, key = base.rpartition('-')
+    # Two-part prefixes (inset-y-0, gap-x-4) before single ones
+    for candidate in (prefix, base.split('-', 1)[0]):
+        if candidate in _SPACING_PROPS:
+            rest = base[len(candidate) + 1:]
+            decls = _spacing(candidate, _SPACING_PROPS[candidate], rest, negative)
+            if decls:
+                return ('layout' if candidate.startswith(('inset', 'top', 'right', 'bottom', 'left')) else 'spacing'), decls, ''
+    if negative:
+        return None
+
+    if base.startswith('space-y-') and _lookup(SPACING, base[8:]):
+        return 'spacing', {'margin-top': _lookup(SPACING, base[8:])}, ' > :not([hidden]) ~ :not([hidden])'
+    if base.startswith('space-x-') and _lookup(SPACING, base[8:]):
+        return 'spacing', {'margin-left': _lookup(SPACING, base[8:])}, ' > :not([hidden]) ~ :not([hidden])'
+    if base.startswith('z-') and (base[2:].isdigit() or _arbitrary(base[2:])):
+        return 'layout', {'z-index': _arbitrary(base[2:]) or base[2:]}, ''
+    if base.startswith('w-') and _lookup(SIZES, base[2:]):
+        return 'sizing', {'width': _lookup(SIZES, base[2:])}, ''
+    if base.startswith('h-') and _lookup(SIZES, base[2:]):
+        return 'sizing', {'height': _lookup(SIZES, base[2:])}, ''
+    if base.startswith('min-w-') and _lookup({'0': '0px', 'full': '100%'}, base[6:]):
+        return 'sizing', {'min-width': _lookup({'0': '0px', 'full': '100%'}, base[6:])}, ''
+    if base.startswith('max-w-') and _lookup(MAX_WIDTHS, base[6:]):
+        return 'sizing', {'max-width': _lookup(MAX_WIDTHS, base[6:])}, ''
+
+    if base.startswith('text-'):
+        key = base[5:]
+        if key in FONT_SIZES:
+            size, line_height = FONT_SIZES[key]
+            return 'typography', {'font-size': size, 'line-height': line_height}, ''
+        color = _rgb(key)
+        if color:
+            return 'color', {'color': color}, ''
+    if base.startswith('font-') and base[5:] in FONT_WEIGHTS:
+        return 'typography', {'font-weight': str(FONT_WEIGHTS[base[5:]])}, ''
+    if base.startswith('placeholder-') and _rgb(base[12:]):
+        return 'color', {'color': _rgb(base[12:])}, '::placeholder'
+    if base.startswith('accent-') and _rgb(base[7:]):
+        return 'color', {'accent-color': _rgb(base[7:])}, ''
+
+    if base.startswith('bg-') and _rgb(base[3:]):
+        return 'background', {'background-color': _rgb(base[3:])}, ''
+    if base.startswith('from-') and _rgb(base[5:]):
+        return 'gradient-from', {
+            '--tw-gradient-from': _rgb(base[5:]),
+            '--tw-gradient-to': _rgb(base[5:].split('/')[0], 0),
+            '--tw-gradient-stops': 'var(--tw-gradient-from), var(--tw-gradient-to)',
+        }, ''
+    if base.startswith('via-') and _rgb(base[4:]):
+        return 'gradient-via', {
+            '--tw-gradient-to': _rgb(base[4:].split('/')[0], 0),
+            '--tw-gradient-stops': f'var(--tw-gradient-from), {_rgb(base[4:])}, var(--tw-gradient-to)',
+        }, ''
+    if base.startswith('to-') and _rgb(base[3:]):
+        return 'gradient-to', {'--tw-gradient-to': _rgb(base[3:])}, ''
+
+    if base == 'border' or (base.startswith('border-') and base[7:].isdigit()):
+        return 'border', {'border-width': f"{base[7:] or 1}px"}, ''
+    for side, prop in (('t', 'top'), ('r', 'right'), ('b', 'bottom'), ('l', 'left')):
+        if base == f'border-{side}' or (base.startswith(f'border-{side}-') and base[9:].isdigit()):
+            return 'border', {f'border-{prop}-width': f"{base[9:] or 1}px"}, ''
+    if base.startswith('border-') and _rgb(base[7:]):
+        return 'border-color', {'border-color': _rgb(base[7:])}, ''
+    if base == 'rounded' or base.startswith('rounded-'):
+        radius = RADII.get(base[8:])
+        if radius:
+            return 'border', {'border-radius': radius}, ''
+
+    if base == 'shadow' or base.startswith('shadow-'):
+        key = base[7:]
+        if key in SHADOWS:
+            shadow = SHADOWS[key]
+            return 'effects', {
+                '--tw-shadow': shadow.format(c=f"rgb(0 0 0 / {SHADOW_ALPHA.get(key, '0.1')})"),
+                '--tw-shadow-colored': shadow.format(c='var(--tw-shadow-color)'),
+                'box-shadow': 'var(--tw-ring-offset-shadow, 0 0 #0000), var(--tw-ring-shadow, 0 0 #0000), var(--tw-shadow)',
+            }, ''
+        if _rgb(key):
+            return 'effects-color', {'--tw-shadow-color': _rgb(key), '--tw-shadow': 'var(--tw-shadow-colored)'}, ''
+    if base.startswith('ring-'):
+        key = base[5:]
+        if key.isdigit():
+            return 'effects', {
+                '--tw-ring-offset-shadow': 'var(--tw-ring-inset) 0 0 0 var(--tw-ring-offset-width) var(--tw-ring-offset-color)',
+                '--tw-ring-shadow': f'var(--tw-ring-inset) 0 0 0 calc({key}px + var(--tw-ring-offset-width)) var(--tw-ring-color)',
+                'box-shadow': 'var(--tw-ring-offset-shadow), var(--tw-ring-shadow), var(--tw-shadow, 0 0 #0000)',
+            }, ''
+        if _rgb(key):
+            return 'effects-color', {'--tw-ring-color': _rgb(key)}, ''
+    if base == 'backdrop-blur' or base.startswith('backdrop-blur-'):
+        radius = BLURS.get(base[14:])
+        if radius:
+            return 'filters', {'-webkit-backdrop-filter': f'blur({radius})', 'backdrop-filter': f'blur({radius})'}, ''
+
+    if base.startswith('scale-'):
+        key = base[6:]
+        value = _arbitrary(key) or (f'{int(key) / 100:g}' if key.isdigit() else None)
+        if value:
+            return 'transforms', {'--tw-scale-x': value, '--tw-scale-y': value, 'transform': TRANSFORM}, ''
+    if base == 'transition' or base.startswith('transition-'):
+        properties = TRANSITION_PROPERTIES.get(base[11:])
+        if properties:
+            return 'transitions', {
+                'transition-property': properties,
+                'transition-timing-function': 'cubic-bezier(0.4, 0, 0.2, 1)',
+                'transition-duration': '150ms',
+            }, ''
+    if base.startswith('duration-') and base[9:].isdigit():
+        return 'transitions-timing', {'transition-duration': f'{base[9:]}ms'}, ''
+    if base.startswith('animate-') and base[8:] in ANIMATIONS:
+        return 'animation', {'animation': ANIMATIONS[base[8:]]}, ''
+    return None
+
+
+PLUGIN_ORDER = (
+    'layout', 'static', 'spacing', 'sizing', 'border', 'border-color', 'background',
+    'gradient-from', 'gradient-via', 'gradient-to', 'typography', 'color', 'effects',
+    'effects-color', 'filters', 'transforms', 'transitions', 'transitions-timing', 'animation',
+)
+
+
+def _escape(name: str) -> str:
+    return re.sub(r'([^a-zA-Z0-9_-])', r'\\\1', name)
+
+
+def compile_class(name: str):
+    """(sort key, media query or None, CSS rule) for a candidate class, or None"""
+    *variants, base = name.split(':')
+    media = None
+    pseudo = ''
+    for variant in variants:
+        if variant in BREAKPOINTS and media is None:
+            media = BREAKPOINTS[variant]
+        elif variant in PSEUDO_VARIANTS:
+            pseudo += PSEUDO_VARIANTS[variant]
+        else:
+            return None
+    compiled = utility(base)
+    if compiled is None:
+        return None
+    plugin, declarations, suffix = compiled
+    selector = f'.{_escape(name)}{pseudo}{suffix}'
+    body = ';'.join(f'{prop}:{value}' for prop, value in declarations.items())
+    variant_rank = tuple(list(PSEUDO_VARIANTS.values()).index(v) for v in re.findall(r':[a-z-]+', pseudo))
+    key = (int(pseudo != ''), variant_rank, PLUGIN_ORDER.index(plugin), name)
+    return (int(media[:-2]) if media else 0, key), media, f'{selector}{{{body}}}'
+
+
+def scan(paths) -> tuple:
+    """Candidate tokens from every source plus the class attributes in them"""
+    candidates, declared = set(), set()
+    for path in paths:
+        text = (ROOT / path).read_text(encoding='utf-8')
+        candidates.update(_TOKEN_RE.findall(text))
+        for match in _CLASS_ATTR_RE.finditer(text):
+            declared.update(match.group(2).split())
+    return candidates, declared
+
+
+def build_css(paths=SOURCES) -> tuple:
+    """Minified stylesheet and the declared classes that produced no rule"""
+    candidates, declared = scan(paths)
+    rules = sorted(filter(None, (compile_class(name) for name in candidates)))
+    generated = {name for name in candidates if compile_class(name)}
+    used_animations = sorted({name.rsplit('animate-', 1)[1] for name in generated if 'animate-' in name})
+
+    parts = [line for line in PREFLIGHT.strip().splitlines()]
+    parts += [f'@keyframes {name}{{{KEYFRAMES[name]}}}' for name in used_animations]
+    current_media = None
+    for (_, _), media, rule in rules:
+        if media != current_media:
+            if current_media:
+                parts.append('}')
+            if media:
+                parts.append(f'@media (min-width:{media}){{')
+            current_media = media
+        parts.append(rule)
+    if current_media:
+        parts.append('}')
+
+    # Font Awesome icons, dynamic f-string fragments and inline-SVG attribute
+    # soup are not Tailwind utilities
+    unknown = sorted(
+        name for name in declared - generated
+        if not name.startswith(('fa-', 'fas', 'far', 'fab')) and '{' not in name and '[' not in name
+        and '=' not in name and '(' not in name
+    )
+    return '\n'.join(parts) + '\n', unknown
+
+
+def write_stylesheet(css: str) -> str:
+    """Write app.<hash>.css and its precompressed siblings (dropping older
+    builds) and update the manifest"""
+    body = css.encode()
+    digest = hashlib.sha256(body).hexdigest()[:10]
+    name = f'css/app.{digest}.css'
+    CSS_DIR.mkdir(parents=True, exist_ok=True)
+    for old in CSS_DIR.glob('app.*.css*'):
+        if not old.name.startswith(Path(name).name):
+            old.unlink()
+    path = CSS_DIR.parent / name
+    path.write_bytes(body)
+    path.with_name(path.name + '.gz').write_bytes(gzip.compress(body, compresslevel=9, mtime=0))
+    if brotli is not None:
+        path.with_name(path.name + '.br').write_bytes(brotli.compress(body, quality=11))
+    manifest = json.loads(MANIFEST.read_text()) if MANIFEST.exists() else {}
+    manifest[ASSET_NAME] = name
+    MANIFEST.write_text(json.dumps(manifest, indent=2, sort_keys=True) + '\n')
+    return name
+
+
+def main(argv) -> int:
+    css, unknown = build_css()
+    for name in unknown:
+        print(f"⚠️ No CSS rule for class '{name}'")
+    if '--check' in argv:
+        manifest = json.loads(MANIFEST.read_text()) if MANIFEST.exists() else {}
+        current = manifest.get(ASSET_NAME)
+        if not current or (CSS_DIR.parent / current).read_text(encoding='utf-8') != css:
+            print("❌ Stylesheet is out of date, run: python build_css.py")
+            return 1
+        print(f"✅ {current} is up to date")
+        return 0
+    name = write_stylesheet(css)
+    print(f"🎨 Wrote static/{name} ({len(css.encode())} bytes)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,121 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded in-process cache with per-entry expiry and LRU eviction"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return a live entry (refreshing its LRU position) or default"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        """Store a value; ttl overrides the cache default for this entry"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return entry[0] if entry else default
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and entry[1] > time.monotonic()
+
+    def stats(self) -> dict:
+        """Counters for the debug stats endpoint"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+        }
+
+
+class VersionedCache:
+    """Per-owner namespaces over a cache backend. Entry keys embed the owner's
+    current version, so invalidate() drops every entry of that owner at once.
+
+    Any object with TTLCache's get/set/pop/stats methods can serve as backend;
+    storing versions in a shared backend makes invalidations visible to every
+    worker. With the in-process default, a worker hands its new version to the
+    client after invalidate() and others observe() it on later requests.
+    Versions are opaque tokens there: a token a worker has not seen yet drops
+    its entries, so no clocks are compared between workers or machines.
+    """
+
+    def __init__(self, entries=None, versions=None):
+        self.entries = entries if entries is not None else TTLCache()
+        self.versions = versions if versions is not None else TTLCache(maxsize=self.entries.maxsize, ttl=86400)
+        self.seen = TTLCache(maxsize=self.entries.maxsize, ttl=86400)
+        self.invalidations = 0
+
+    def version(self, owner):
+        """Current version of owner (created on first use)"""
+        version = self.versions.get(owner)
+        if version is None:
+            # A fresh, never-reused version: entries of an evicted version stay unreachable
+            version = time.time_ns()
+            self.versions.set(owner, version)
+        return version
+
+    def _bump(self, owner) -> int:
+        # Strictly increasing locally, unique across workers in practice
+        version = max(self.version(owner) + 1, time.time_ns())
+        self.versions.set(owner, version)
+        return version
+
+    def get(self, owner, key, default=None):
+        return self.entries.get((owner, self.version(owner), key), default)
+
+    def set(self, owner, key, value, ttl: float = None):
+        self.entries.set((owner, self.version(owner), key), value, ttl)
+
+    def observe(self, owner, token: int):
+        """A version handed over by another worker: unless this worker has
+        already seen it, entries cached here for owner become unreachable"""
+        if self.seen.get(owner) != token:
+            self.seen.set(owner, token)
+            self._bump(owner)
+
+    def invalidate(self, owner):
+        """Make every entry cached for owner unreachable"""
+        self.seen.set(owner, self._bump(owner))
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {**self.entries.stats(), 'invalidations': self.invalidations}
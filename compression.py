@@ -0,0 +1,168 @@
+import os
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Dynamic responses: compressed on the fly (streamed bodies are flushed per
+# chunk), skipped below COMPRESS_MIN_SIZE bytes where headers cost more
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml', 'application/xml')
+AVAILABLE_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# HTML without its own Cache-Control: pages for a browser with a session
+# (access or refresh cookie, the token may be refreshed inside the app) are
+# private and always revalidated, anonymous GETs may be cached briefly.
+# Responses setting cookies are never stored by shared caches.
+AUTHENTICATED_CACHE_CONTROL = "private, no-cache"
+ANONYMOUS_CACHE_CONTROL = os.getenv("ANONYMOUS_CACHE_CONTROL", "public, max-age=60")
+SET_COOKIE_CACHE_CONTROL = "private, no-store"
+SESSION_COOKIES = ('sb_access_token=', 'sb_refresh_token=')
+
+compression_stats = {
+    'responses': 0,
+    'compressed': 0,
+    'bytes_in': 0,
+    'bytes_out': 0,
+}
+
+
+def accepted_encoding(accept_encoding: str, available=AVAILABLE_ENCODINGS):
+    """Best coding the client accepts among available (in order), or None"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    for coding in available:
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+class _Compressor:
+    def __init__(self, coding: str):
+        if coding == 'br':
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress and flush so the client can render what arrived so far"""
+        if self._brotli:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes) -> bytes:
+        if self._brotli:
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+def _apply_cache_headers(scope, request_headers: Headers, headers: MutableHeaders):
+    if 'set-cookie' in headers and 'public' in headers.get('cache-control', 'public'):
+        # Session cookies (e.g. refreshed tokens) must never reach a shared cache
+        headers['Cache-Control'] = SET_COOKIE_CACHE_CONTROL
+        return
+    if 'cache-control' in headers or not headers.get('content-type', '').startswith('text/html'):
+        return
+    if scope['method'] not in ('GET', 'HEAD'):
+        headers['Cache-Control'] = 'no-store'
+    elif any(cookie in request_headers.get('cookie', '') for cookie in SESSION_COOKIES):
+        headers['Cache-Control'] = AUTHENTICATED_CACHE_CONTROL
+        headers.add_vary_header('Cookie')
+    else:
+        headers['Cache-Control'] = ANONYMOUS_CACHE_CONTROL
+        headers.add_vary_header('Cookie')
+
+
+class CompressionMiddleware:
+    """gzip/brotli negotiation for text responses plus Cache-Control and Vary
+    for HTML; responses that are already encoded (prerendered shells),
+    partial or binary (downloads) pass through untouched"""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        request_headers = Headers(scope=scope)
+        coding = accepted_encoding(request_headers.get('accept-encoding'))
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message['type'] == 'http.response.start':
+                start = message
+                return
+            if message['type'] != 'http.response.body' or passthrough:
+                if start is not None and not passthrough and compressor is None:
+                    # http.response.pathsend (server-side sendfile): no body to compress
+                    passthrough = True
+                    headers = MutableHeaders(raw=list(start['headers']))
+                    _apply_cache_headers(scope, request_headers, headers)
+                    await send({**start, 'headers': headers.raw})
+                return await send(message)
+            if compressor is not None:
+                body = message.get('body', b'')
+                more_body = message.get('more_body', False)
+                data = compressor.chunk(body) if more_body else compressor.finish(body)
+                compression_stats['bytes_in'] += len(body)
+                compression_stats['bytes_out'] += len(data)
+                return await send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+            # First body chunk: decide with the full set of response headers
+            compression_stats['responses'] += 1
+            headers = MutableHeaders(raw=list(start['headers']))
+            _apply_cache_headers(scope, request_headers, headers)
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            compressible = (
+                start['status'] not in (204, 206, 304)
+                and scope['method'] != 'HEAD'
+                and 'content-encoding' not in headers
+                and headers.get('content-type', '').startswith(COMPRESSIBLE_TYPES)
+            )
+            if compressible:
+                headers.add_vary_header('Accept-Encoding')
+            if not compressible or coding is None or (not more_body and len(body) < self.minimum_size):
+                passthrough = True
+                await send({**start, 'headers': headers.raw})
+                return await send(message)
+
+            compressor = _Compressor(coding)
+            headers['Content-Encoding'] = coding
+            del headers['Content-Length']
+            compression_stats['compressed'] += 1
+            await send({**start, 'headers': headers.raw})
+            data = compressor.chunk(body) if more_body else compressor.finish(body)
+            compression_stats['bytes_in'] += len(body)
+            compression_stats['bytes_out'] += len(data)
+            await send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def get_compression_stats() -> dict:
+    bytes_in = compression_stats['bytes_in']
+    return {
+        **compression_stats,
+        'encodings': list(AVAILABLE_ENCODINGS),
+        'ratio': round(compression_stats['bytes_out'] / bytes_in, 4) if bytes_in else 0.0,
+    }
@@ -1,8 +1,19 @@
 import os
+import json
+import time
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from supabase import create_client, Client
+import base64
+import httpx
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
+from cache import TTLCache, VersionedCache
+
+# The Supabase SDK (supabase, postgrest, supabase_auth, storage3) is the
+# largest import of the app; it is loaded when the first client is built so
+# cold starts that only serve pages or static files never pay for it
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+    from supabase_auth import AsyncGoTrueClient
 
 # Load environment variables
 load_dotenv()
@@ -12,22 +23,210 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY", SUPABASE_ANON_KEY)
 
-# Create Supabase client with service role for admin operations
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+# Shared HTTP connection pool (keep-alive) used by PostgREST, Storage and Auth
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "100"))
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", "20"))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "60"))
+
+# Dashboard listing: keyset page size and the columns the document cards display
+DOCUMENTS_PAGE_SIZE = int(os.getenv("DOCUMENTS_PAGE_SIZE", "50"))
+DOCUMENTS_MAX_PAGE_SIZE = 200
+DOCUMENT_CARD_COLUMNS = 'id,filename,description,uploaded_at,file_size,mime_type,stored_filename'
+# Single-document lookups (delete, download, view); extracted_text (up to
+# MAX_TEXT_CHARS) and search_vector are only loaded by callers that ask for them
+DOCUMENT_COLUMNS = 'id,user_id,filename,description,stored_filename,file_path,mime_type,file_size,uploaded_at,content_sha256'
+
+# Per-user read caches (document pages/lookups are dropped on save/delete;
+# other workers follow through the docs_version cookie, see auth.py)
+DOCUMENT_CACHE_SIZE = int(os.getenv("DOCUMENT_CACHE_SIZE", "2048"))
+DOCUMENT_CACHE_TTL = int(os.getenv("DOCUMENT_CACHE_TTL", "60"))  # seconds
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "300"))  # seconds
+
+document_cache = VersionedCache(TTLCache(maxsize=DOCUMENT_CACHE_SIZE, ttl=DOCUMENT_CACHE_TTL))
+profile_cache = TTLCache(maxsize=DOCUMENT_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+
+# Supabase Storage bucket name
+STORAGE_BUCKET = "documents"
+
+# Objects no row references are moved here, re-checked and then deleted
+TRASH_PREFIX = "_trash"
+
+# Bulk operations: ids per in_() filter (keeps request URLs short), paths
+# per storage remove/sign call and objects per storage list page
+ID_BATCH_SIZE = 200
+STORAGE_REMOVE_BATCH = 1000
+STORAGE_SIGN_BATCH = 1000
+STORAGE_LIST_PAGE = 1000
+
+# Short-lived signed download URLs (private bucket), reused per stored_filename
+# until SIGNED_URL_MARGIN seconds before they expire
+SIGNED_URL_TTL = int(os.getenv("SIGNED_URL_TTL", "3600"))  # seconds
+SIGNED_URL_MARGIN = int(os.getenv("SIGNED_URL_MARGIN", "300"))  # seconds
+SIGNED_URL_CACHE_SIZE = int(os.getenv("SIGNED_URL_CACHE_SIZE", "10000"))
+
+signed_url_cache = TTLCache(maxsize=SIGNED_URL_CACHE_SIZE, ttl=SIGNED_URL_TTL - SIGNED_URL_MARGIN)
+
+_http_client = None
+_supabase = None
+_auth_client = None
+
+# Requests made as the user (RLS) go through user_request: the shared pool
+# with the user's bearer token added per call. Each one used to build its own
+# client (create_client + auth.set_session, i.e. a TLS setup and a session
+# round trip), so every call counts as a construction avoided.
+client_stats = {
+    'user_requests': 0,
+    'user_request_ms': 0.0,
+}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive connection pool for every Supabase call"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+                keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT),
+        )
+    return _http_client
+
+
+def get_supabase() -> 'AsyncClient':
+    """Async Supabase client with service role for admin operations"""
+    global _supabase
+    if _supabase is None:
+        from supabase import AsyncClient, AsyncClientOptions
+        _supabase = AsyncClient(
+            SUPABASE_URL,
+            SUPABASE_SERVICE_KEY,
+            AsyncClientOptions(
+                httpx_client=get_http_client(),
+                auto_refresh_token=False,
+                persist_session=False,
+            ),
+        )
+    return _supabase
+
+
+def get_auth_client() -> 'AsyncGoTrueClient':
+    """Async Auth client for user-facing flows (kept apart so sign-ins never
+    change the headers of the service-role PostgREST client)"""
+    global _auth_client
+    if _auth_client is None:
+        from supabase_auth import AsyncGoTrueClient
+        _auth_client = AsyncGoTrueClient(
+            url=f"{SUPABASE_URL}/auth/v1",
+            headers=_user_headers(SUPABASE_ANON_KEY),
+            auto_refresh_token=False,
+            persist_session=False,
+            http_client=get_http_client(),
+        )
+    return _auth_client
 
-# Thread pool for async operations (optimized for I/O operations)
-executor = ThreadPoolExecutor(max_workers=10)
+
+def _user_headers(access_token: str) -> dict:
+    """Headers that make Supabase apply RLS for the given user token"""
+    return {
+        'apikey': SUPABASE_ANON_KEY,
+        'Authorization': f'Bearer {access_token}',
+    }
+
+
+def _batches(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def user_request(access_token: str, method: str, path: str, headers: dict = None, **kwargs) -> httpx.Response:
+    """Call a Supabase endpoint (path under SUPABASE_URL) as the user, so RLS
+    applies; the client factory for user-scoped calls, which never builds a
+    per-user client"""
+    client_stats['user_requests'] += 1
+    started = time.perf_counter()
+    try:
+        return await get_http_client().request(
+            method, f"{SUPABASE_URL}{path}",
+            headers={**_user_headers(access_token), **(headers or {})},
+            **kwargs
+        )
+    finally:
+        client_stats['user_request_ms'] += (time.perf_counter() - started) * 1000
+
+
+def get_client_stats() -> dict:
+    """User-scoped calls served on the shared pool, i.e. client constructions
+    and set_session round trips avoided, and their average latency"""
+    requests = client_stats['user_requests']
+    return {
+        'user_requests': requests,
+        'constructions_avoided': requests,
+        'avg_user_request_ms': round(client_stats['user_request_ms'] / requests, 3) if requests else 0.0,
+        'pool': {
+            'max_connections': SUPABASE_MAX_CONNECTIONS,
+            'max_keepalive': SUPABASE_MAX_KEEPALIVE,
+        },
+    }
+
+
+async def close_clients():
+    """Close the shared connection pool (app shutdown)"""
+    global _http_client, _supabase, _auth_client
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = _supabase = _auth_client = None
 
 async def init_db():
     """Initialize database - Supabase Auth handles user management"""
     print("Supabase Auth configurado. Los usuarios se gestionan automáticamente.")
+
+async def warm_connections(per_endpoint: int = 2) -> dict:
+    """Build the shared clients and open pooled connections by calling the
+    Auth, PostgREST and Storage endpoints concurrently, so DNS, TCP and TLS
+    are paid before the first request. Status code per endpoint; raises when
+    any endpoint is unreachable or answers with a non-2xx status."""
+    get_supabase()
+    get_auth_client()
+    service_headers = {'apikey': SUPABASE_SERVICE_KEY, 'Authorization': f'Bearer {SUPABASE_SERVICE_KEY}'}
+    endpoints = {
+        'auth': ('GET', f"{SUPABASE_URL}/auth/v1/health", {'apikey': SUPABASE_ANON_KEY}),
+        'rest': ('HEAD', f"{SUPABASE_URL}/rest/v1/documents?select=id&limit=1", service_headers),
+        'storage': ('GET', f"{SUPABASE_URL}/storage/v1/bucket/{STORAGE_BUCKET}", service_headers),
+    }
+    # Concurrent requests each take their own connection; stay within what
+    # the pool keeps alive
+    per_endpoint = max(1, min(per_endpoint, SUPABASE_MAX_KEEPALIVE // len(endpoints)))
+    client = get_http_client()
+
+    async def call(method, url, headers):
+        response = await client.request(method, url, headers=headers)
+        if not response.is_success:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        return response.status_code
+
+    results = await asyncio.gather(*(
+        call(*endpoint) for endpoint in endpoints.values() for _ in range(per_endpoint)
+    ), return_exceptions=True)
+    by_endpoint = {name: results[i * per_endpoint:(i + 1) * per_endpoint] for i, name in enumerate(endpoints)}
+    failed = {
+        name: next(r for r in group if isinstance(r, BaseException))
+        for name, group in by_endpoint.items() if any(isinstance(r, BaseException) for r in group)
+    }
+    if failed:
+        raise RuntimeError(', '.join(f"{name}: {type(e).__name__}: {e}" for name, e in failed.items()))
+    return {name: group[0] for name, group in by_endpoint.items()}
    
 
 async def signup_user(email: str, password: str, name: str, student_code: str):
     """Sign up user with Supabase Auth - trigger creates profile automatically"""
     try:
         # Create auth user - the trigger will create the profile automatically
-        auth_response = supabase.auth.sign_up({
+        auth_response = await get_auth_client().sign_up({
             "email": email,
             "password": password,
             "options": {
@@ -49,26 +248,21 @@ async def signup_user(email: str, password: str, name: str, student_code: str):
         return None
 
 async def signin_user(email: str, password: str):
-    """Sign in user with Supabase Auth - optimized with async execution"""
-    def _signin():
-        try:
-            response = supabase.auth.sign_in_with_password({
-                "email": email,
-                "password": password
-            })
-            return response
-        except Exception as e:
-            print(f"❌ Error signing in: {e}")
-            return None
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _signin)
+    """Sign in user with Supabase Auth"""
+    try:
+        return await get_auth_client().sign_in_with_password({
+            "email": email,
+            "password": password
+        })
+    except Exception as e:
+        print(f"❌ Error signing in: {e}")
+        return None
 
 async def reset_password_email(email: str, redirect_to: str = None):
     """Send password reset email"""
     try:
         options = {"redirect_to": redirect_to} if redirect_to else {}
-        response = supabase.auth.reset_password_for_email(email, options)
+        response = await get_auth_client().reset_password_for_email(email, options)
         print(f"✅ Reset email sent to {email} with redirect: {redirect_to}")
         print(f"Response: {response}")
         return True  # Return True on success
@@ -78,23 +272,61 @@ async def reset_password_email(email: str, redirect_to: str = None):
         traceback.print_exc()
         return False
 
+async def update_user_password(access_token: str, password: str):
+    """Set a new password for the user owning access_token (recovery link)"""
+    try:
+        response = await user_request(access_token, 'PUT', '/auth/v1/user', json={"password": password})
+        response.raise_for_status()
+        return True
+    except Exception as e:
+        print(f"Error updating password: {e}")
+        return False
+
+async def refresh_auth_session(refresh_token: str):
+    """Exchange a refresh token for a new session dict (access_token,
+    refresh_token, expires_in, ...). Returns None only when Supabase rejects
+    the token (400/401, invalid_grant); rate limiting (429), server and
+    network errors raise so the caller keeps the cookies and retries later."""
+    response = await get_http_client().post(
+        f"{SUPABASE_URL}/auth/v1/token",
+        params={"grant_type": "refresh_token"},
+        headers={'apikey': SUPABASE_ANON_KEY},
+        json={"refresh_token": refresh_token}
+    )
+    if response.status_code in (400, 401):
+        print(f"Refresh token rejected: {response.status_code}")
+        return None
+    response.raise_for_status()
+    return response.json()
+
+async def get_auth_user(access_token: str):
+    """Resolve an access token to its user through Supabase Auth"""
+    try:
+        response = await get_auth_client().get_user(access_token)
+        return response.user if response and response.user else None
+    except Exception as e:
+        print(f"Error getting user: {e}")
+        return None
+
 async def get_user_profile(user_id: str):
-    """Get user profile by ID - optimized with async execution"""
-    def _get_profile():
-        try:
-            response = supabase.table('profiles').select('*').eq('id', user_id).execute()
-            return response.data[0] if response.data else None
-        except Exception as e:
-            print(f"Error getting profile: {e}")
-            return None
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _get_profile)
+    """Get user profile by ID (cached)"""
+    profile = profile_cache.get(user_id)
+    if profile is not None:
+        return profile
+    try:
+        response = await get_supabase().table('profiles').select('*').eq('id', user_id).execute()
+        profile = response.data[0] if response.data else None
+        if profile:
+            profile_cache.set(user_id, profile)
+        return profile
+    except Exception as e:
+        print(f"Error getting profile: {e}")
+        return None
 
 async def get_profile_by_email(email: str):
     """Get profile by email"""
     try:
-        response = supabase.table('profiles').select('*').eq('email', email).execute()
+        response = await get_supabase().table('profiles').select('*').eq('email', email).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Error getting profile by email: {e}")
@@ -103,52 +335,397 @@ async def get_profile_by_email(email: str):
 async def get_profile_by_student_code(student_code: str):
     """Get profile by student code"""
     try:
-        response = supabase.table('profiles').select('*').eq('student_code', student_code).execute()
+        response = await get_supabase().table('profiles').select('*').eq('student_code', student_code).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Error getting profile by student code: {e}")
         return None
 
 async def save_document(user_id: str, filename: str, stored_filename: str, 
-                       file_path: str, file_size: int, mime_type: str, description: str = None):
-    """Save document metadata - optimized with async execution"""
-    def _save_document():
+                       file_path: str, file_size: int, mime_type: str, description: str = None,
+                       content_sha256: str = None):
+    """Save document metadata"""
+    try:
+        response = await get_supabase().table('documents').insert({
+            'user_id': user_id,
+            'filename': filename,
+            'stored_filename': stored_filename,
+            'file_path': file_path,
+            'file_size': file_size,
+            'mime_type': mime_type,
+            'description': description,
+            'content_sha256': content_sha256
+        }).execute()
+        document_cache.invalidate(user_id)
+        return response.data[0] if response.data else None
+    except Exception as e:
+        print(f"Error saving document: {e}")
+        return None
+
+async def save_documents(user_id: str, documents: list):
+    """Save metadata for several documents in one bulk insert"""
+    try:
+        response = await get_supabase().table('documents').insert([
+            {'user_id': user_id, **doc} for doc in documents
+        ]).execute()
+        document_cache.invalidate(user_id)
+        return response.data or []
+    except Exception as e:
+        print(f"Error saving documents: {e}")
+        return None
+
+async def find_documents_by_hash(hashes, user_id: str = None):
+    """Map content hashes to a documents row (stored_filename, file_size,
+    mime_type) whose object has that content. Restricted to user_id's
+    documents unless user_id is None."""
+    found = {}
+    try:
+        for batch in _batches([h for h in set(hashes) if h], ID_BATCH_SIZE):
+            query = get_supabase().table('documents').select('content_sha256,stored_filename,file_size,mime_type').in_('content_sha256', batch)
+            if user_id is not None:
+                query = query.eq('user_id', user_id)
+            response = await query.execute()
+            for row in response.data or []:
+                found.setdefault(row['content_sha256'], row)
+    except Exception as e:
+        print(f"Error looking up content hashes: {e}")
+    return found
+
+def encode_cursor(doc: dict) -> str:
+    """Opaque keyset cursor for the (uploaded_at, id) position of a document"""
+    raw = json.dumps([doc['uploaded_at'], doc['id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; None for missing or malformed cursors"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        uploaded_at, doc_id = map(str, json.loads(raw))
+    except (ValueError, TypeError):
+        return None
+    # Values are quoted into a PostgREST filter
+    if any(c in value for value in (uploaded_at, doc_id) for c in '"\\'):
+        return None
+    return uploaded_at, doc_id
+
+async def list_user_documents(user_id: str, cursor: str = None, limit: int = DOCUMENTS_PAGE_SIZE,
+                              columns: str = DOCUMENT_CARD_COLUMNS):
+    """Get one keyset page of a user's documents, newest first.
+    Returns (documents, next_cursor); next_cursor is None on the last page."""
+    limit = max(1, min(limit, DOCUMENTS_MAX_PAGE_SIZE))
+    cache_key = ('page', cursor, limit, columns)
+    page = document_cache.get(user_id, cache_key)
+    if page is not None:
+        return page
+    try:
+        query = get_supabase().table('documents').select(columns).eq('user_id', user_id)
+        position = decode_cursor(cursor)
+        if position:
+            uploaded_at, doc_id = position
+            query = query.or_(
+                f'uploaded_at.lt."{uploaded_at}",'
+                f'and(uploaded_at.eq."{uploaded_at}",id.lt."{doc_id}")'
+            )
+        # Fetch one extra row to know whether another page exists
+        response = await query.order('uploaded_at', desc=True).order('id', desc=True).limit(limit + 1).execute()
+        documents = response.data or []
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = encode_cursor(documents[-1])
+        document_cache.set(user_id, cache_key, (documents, next_cursor))
+        return documents, next_cursor
+    except Exception as e:
+        print(f"Error listing documents: {e}")
+        return [], None
+
+async def search_user_documents(user_id: str, query: str, offset: int = 0, limit: int = DOCUMENTS_PAGE_SIZE):
+    """Ranked full-text search over a user's filenames, descriptions and extracted text.
+    Returns (documents, next_offset); next_offset is None on the last page."""
+    limit = max(1, min(limit, DOCUMENTS_MAX_PAGE_SIZE))
+    offset = max(0, offset)
+    try:
+        # Fetch one extra row to know whether another page exists
+        response = await get_supabase().rpc('search_documents', {
+            'p_user_id': user_id,
+            'p_query': query,
+            'p_limit': limit + 1,
+            'p_offset': offset,
+        }).execute()
+        documents = response.data or []
+        next_offset = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_offset = offset + limit
+        return documents, next_offset
+    except Exception as e:
+        print(f"Error searching documents: {e}")
+        return [], None
+
+async def get_document(user_id: str, doc_id: str, columns: str = DOCUMENT_COLUMNS):
+    """Get a single document owned by user_id (cached)"""
+    doc = document_cache.get(user_id, ('doc', doc_id, columns))
+    if doc is not None:
+        return doc
+    try:
+        response = await get_supabase().table('documents').select(columns).eq('id', doc_id).eq('user_id', user_id).limit(1).execute()
+        doc = response.data[0] if response.data else None
+        if doc:
+            document_cache.set(user_id, ('doc', doc_id, columns), doc)
+        return doc
+    except Exception as e:
+        print(f"Error getting document: {e}")
+        return None
+
+async def get_documents(user_id: str, doc_ids: list, columns: str = 'id,stored_filename'):
+    """Get the documents among doc_ids that belong to user_id"""
+    documents = []
+    try:
+        for batch in _batches(list(doc_ids), ID_BATCH_SIZE):
+            response = await get_supabase().table('documents').select(columns).eq('user_id', user_id).in_('id', batch).execute()
+            documents.extend(response.data or [])
+        return documents
+    except Exception as e:
+        print(f"Error getting documents: {e}")
+        return None
+
+async def delete_documents(user_id: str, doc_ids: list):
+    """Delete several documents owned by user_id"""
+    try:
+        for batch in _batches(list(doc_ids), ID_BATCH_SIZE):
+            await get_supabase().table('documents').delete().eq('user_id', user_id).in_('id', batch).execute()
+        return True
+    except Exception as e:
+        print(f"Error deleting documents: {e}")
+        return False
+    finally:
+        document_cache.invalidate(user_id)
+
+async def delete_document(doc_id: str, user_id: str):
+    """Delete a document owned by user_id"""
+    try:
+        await get_supabase().table('documents').delete().eq('id', doc_id).eq('user_id', user_id).execute()
+        document_cache.invalidate(user_id)
+        return True
+    except Exception as e:
+        print(f"Error deleting document: {e}")
+        return False
+
+async def update_document_file(user_id: str, doc_id: str, stored_filename: str, file_path: str):
+    """Point a document at another stored object"""
+    try:
+        await get_supabase().table('documents').update({
+            'stored_filename': stored_filename,
+            'file_path': file_path,
+        }).eq('id', doc_id).eq('user_id', user_id).execute()
+        document_cache.invalidate(user_id)
+        return True
+    except Exception as e:
+        print(f"Error updating document file: {e}")
+        return False
+
+def get_cache_stats() -> dict:
+    """Size, hit ratio and eviction counters of the data-layer caches"""
+    return {
+        'documents': document_cache.stats(),
+        'profiles': profile_cache.stats(),
+        'signed_urls': signed_url_cache.stats(),
+    }
+
+async def save_extraction(user_id: str, doc_id: str, fields: dict):
+    """Store extraction results (text, counts, metadata, status) on a document"""
+    try:
+        # returning=minimal: the updated row would carry the whole extracted_text back
+        await get_supabase().table('documents').update(fields, returning='minimal').eq('id', doc_id).eq('user_id', user_id).execute()
+        document_cache.invalidate(user_id)
+        return True
+    except Exception as e:
+        print(f"Error saving extraction: {e}")
+        return False
+
+async def download_file(path: str) -> bytes:
+    """Download a stored object with the service role"""
+    return await get_supabase().storage.from_(STORAGE_BUCKET).download(path)
+
+async def upload_stream(access_token: str, path: str, chunks, content_type: str):
+    """Upload an async iterator of byte chunks as the user (RLS) without buffering it"""
+    response = await user_request(
+        access_token, 'POST', f"/storage/v1/object/{STORAGE_BUCKET}/{path}",
+        headers={
+            'Content-Type': content_type,
+            'x-upsert': 'false'
+        },
+        content=chunks
+    )
+    response.raise_for_status()
+    return response.json()
+
+async def put_object(path: str, content, content_type: str = 'application/octet-stream'):
+    """Write (or overwrite) an object with the service role; content is bytes
+    or an async iterator of chunks, streamed without buffering"""
+    response = await get_http_client().post(
+        f"{SUPABASE_URL}/storage/v1/object/{STORAGE_BUCKET}/{path}",
+        headers={
+            'apikey': SUPABASE_SERVICE_KEY,
+            'Authorization': f'Bearer {SUPABASE_SERVICE_KEY}',
+            'Content-Type': content_type,
+            'x-upsert': 'true'
+        },
+        content=content
+    )
+    response.raise_for_status()
+    return response.json()
+
+async def list_files(prefix: str, page_size: int = STORAGE_LIST_PAGE) -> list:
+    """Every object directly under a storage folder (sub-folders have id None),
+    fetched page by page"""
+    bucket = get_supabase().storage.from_(STORAGE_BUCKET)
+    items = []
+    while True:
+        page = await bucket.list(prefix, {'limit': page_size, 'offset': len(items), 'sortBy': {'column': 'name', 'order': 'asc'}})
+        items.extend(page)
+        if len(page) < page_size:
+            return items
+
+async def _referenced_files(paths: list):
+    """The paths among paths that a documents row references, or None when
+    they could not be counted"""
+    referenced = set()
+    try:
+        for batch in _batches(paths, ID_BATCH_SIZE):
+            response = await get_supabase().table('documents').select('stored_filename').in_('stored_filename', batch).execute()
+            referenced.update(row['stored_filename'] for row in response.data or [])
+    except Exception as e:
+        print(f"Error counting file references: {e}")
+        return None
+    return referenced
+
+async def _trash_file(path: str) -> bool:
+    try:
+        await move_file(path, f"{TRASH_PREFIX}/{path}")
+    except Exception as e:
+        print(f"Error moving {path} to trash: {e}")
+        return False
+    signed_url_cache.pop(path)
+    return True
+
+async def remove_unreferenced_files(paths):
+    """Remove the storage objects among paths that no documents row references
+    any more (deduplicated uploads share one object between rows).
+
+    An upload may deduplicate onto an object while it is being removed, so
+    orphans are first moved to TRASH_PREFIX and their references counted
+    again: see settle_trashed_files. Returns the removed paths."""
+    paths = list(set(paths))
+    referenced = await _referenced_files(paths)
+    if referenced is None:
+        # Keep the objects rather than risk deleting shared content
+        return []
+    orphans = [path for path in paths if path not in referenced]
+    moved = await asyncio.gather(*(_trash_file(path) for path in orphans))
+    return await settle_trashed_files([path for path, ok in zip(orphans, moved) if ok])
+
+async def settle_trashed_files(paths):
+    """Move trashed objects that a row references again back into place and
+    delete the rest; returns the deleted paths. Objects stay in the trash when
+    references cannot be counted (the upload sweeper retries them)."""
+    paths = list(paths)
+    referenced = await _referenced_files(paths)
+    if not paths or referenced is None:
+        return []
+    for path in referenced:
+        print(f"♻️ Restoring {path}: a new document references it")
         try:
-            response = supabase.table('documents').insert({
-                'user_id': user_id,
-                'filename': filename,
-                'stored_filename': stored_filename,
-                'file_path': file_path,
-                'file_size': file_size,
-                'mime_type': mime_type,
-                'description': description
-            }).execute()
-            return response.data[0] if response.data else None
+            await move_file(f"{TRASH_PREFIX}/{path}", path)
         except Exception as e:
-            print(f"Error saving document: {e}")
+            print(f"Error restoring {path} from trash: {e}")
+    removed = [path for path in paths if path not in referenced]
+    if removed:
+        await remove_files([f"{TRASH_PREFIX}/{path}" for path in removed])
+    return removed
+
+async def open_file_stream(path: str, byte_range: str = None) -> httpx.Response:
+    """Start streaming a stored object with the service role; byte_range is an
+    HTTP Range value. The caller must aclose() the returned response."""
+    headers = {
+        'apikey': SUPABASE_SERVICE_KEY,
+        'Authorization': f'Bearer {SUPABASE_SERVICE_KEY}',
+        # Relay the stored bytes as-is so lengths and ranges stay exact
+        'Accept-Encoding': 'identity',
+    }
+    if byte_range:
+        headers['Range'] = byte_range
+    client = get_http_client()
+    request = client.build_request(
+        'GET',
+        f"{SUPABASE_URL}/storage/v1/object/authenticated/{STORAGE_BUCKET}/{path}",
+        headers=headers
+    )
+    return await client.send(request, stream=True)
+
+async def create_upload_url(path: str) -> dict:
+    """Presigned URL (and token) the browser can upload one object to directly"""
+    return await get_supabase().storage.from_(STORAGE_BUCKET).create_signed_upload_url(path)
+
+async def move_file(from_path: str, to_path: str):
+    """Rename a stored object with the service role"""
+    return await get_supabase().storage.from_(STORAGE_BUCKET).move(from_path, to_path)
+
+async def probe_file(path: str, length: int = 16):
+    """Leading bytes, total size and content type of a stored object with one
+    ranged request, or None when the object does not exist"""
+    response = await open_file_stream(path, f'bytes=0-{length - 1}')
+    try:
+        if response.status_code == 416:
+            # Only an empty object has no byte 0
+            return b'', 0, response.headers.get('content-type')
+        if response.status_code not in (200, 206):
             return None
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _save_document)
+        head = await response.aread()
+        size = len(head)
+        content_range = response.headers.get('content-range', '')
+        if response.status_code == 206 and '/' in content_range:
+            size = int(content_range.rsplit('/', 1)[1])
+        return head[:length], size, response.headers.get('content-type')
+    finally:
+        await response.aclose()
 
-async def get_user_documents(user_id: str):
-    """Get all documents for a user - optimized with async execution"""
-    def _get_documents():
-        try:
-            response = supabase.table('documents').select('*').eq('user_id', user_id).order('uploaded_at', desc=True).execute()
-            return response.data if response.data else []
-        except Exception as e:
-            print(f"Error getting documents: {e}")
-            return []
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _get_documents)
+async def get_public_url(path: str):
+    """Public URL of a stored file"""
+    return await get_supabase().storage.from_(STORAGE_BUCKET).get_public_url(path)
 
-async def delete_document(doc_id: str):
-    """Delete a document"""
+async def create_signed_urls(paths) -> dict:
+    """Signed download URLs by path: cached URLs are reused and the rest are
+    signed with one storage call per STORAGE_SIGN_BATCH paths"""
+    urls = {}
+    missing = []
+    for path in dict.fromkeys(paths):
+        url = signed_url_cache.get(path)
+        if url is None:
+            missing.append(path)
+        else:
+            urls[path] = url
     try:
-        supabase.table('documents').delete().eq('id', doc_id).execute()
+        for batch in _batches(missing, STORAGE_SIGN_BATCH):
+            signed = await get_supabase().storage.from_(STORAGE_BUCKET).create_signed_urls(batch, SIGNED_URL_TTL)
+            for item in signed:
+                if item.get('signedURL') and not item.get('error'):
+                    urls[item['path']] = item['signedURL']
+                    signed_url_cache.set(item['path'], item['signedURL'])
+    except Exception as e:
+        print(f"Error creating signed URLs: {e}")
+    return urls
+
+async def remove_files(paths: list):
+    """Remove files from storage (one call per STORAGE_REMOVE_BATCH paths)"""
+    try:
+        for batch in _batches(list(paths), STORAGE_REMOVE_BATCH):
+            await get_supabase().storage.from_(STORAGE_BUCKET).remove(batch)
+            for path in batch:
+                signed_url_cache.pop(path)
         return True
     except Exception as e:
-        print(f"Error deleting document: {e}")
+        print(f"Error deleting file from storage: {e}")
         return False
@@ -0,0 +1,146 @@
+import os
+import re
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import quote
+from starlette.background import BackgroundTask
+from starlette.responses import Response, StreamingResponse
+from database import open_file_stream
+
+# Bytes per chunk relayed from storage to the client
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+# Stored objects never change (new uploads get a new path), so browsers may
+# reuse them and only revalidate with If-None-Match / If-Modified-Since
+DOWNLOAD_CACHE_CONTROL = "private, no-cache"
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+_STORED_AT_RE = re.compile(r'/(\d{8}_\d{6})')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def file_etag(stored_filename: str) -> str:
+    """Strong ETag: the object path is unique per content and never rewritten"""
+    return '"' + hashlib.sha256(stored_filename.encode()).hexdigest()[:32] + '"'
+
+
+def file_last_modified(doc: dict) -> datetime:
+    """Upload time encoded in the object path (storage_path), else uploaded_at"""
+    match = _STORED_AT_RE.search(doc['stored_filename'])
+    if match:
+        return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S').replace(tzinfo=timezone.utc)
+    uploaded_at = datetime.fromisoformat(doc['uploaded_at'].replace('Z', '+00:00'))
+    if uploaded_at.tzinfo is None:
+        uploaded_at = uploaded_at.replace(tzinfo=timezone.utc)
+    return uploaded_at.replace(microsecond=0)
+
+
+def parse_range(header: str, size: int):
+    """(start, end) inclusive for a single 'bytes=' range, or None to send the
+    whole file (no header, multiple ranges or an unknown unit)"""
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def not_modified(request, etag: str, last_modified: datetime) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _range_applies(request, etag: str, last_modified: datetime) -> bool:
+    """If-Range: only honour Range while the client's copy is still current"""
+    if_range = request.headers.get('if-range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    try:
+        return parsedate_to_datetime(if_range) >= last_modified
+    except (TypeError, ValueError):
+        return False
+
+
+def content_disposition(filename: str, inline: bool) -> str:
+    fallback = filename.encode('ascii', 'ignore').decode().replace('"', '') or 'documento'
+    kind = 'inline' if inline else 'attachment'
+    return f"{kind}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+async def stream_download(request, doc: dict, inline: bool = False):
+    """Relay a stored document in chunks with Range/206, ETag and 304 support"""
+    etag = file_etag(doc['stored_filename'])
+    last_modified = file_last_modified(doc)
+    size = doc['file_size']
+    headers = {
+        'ETag': etag,
+        'Last-Modified': format_datetime(last_modified, usegmt=True),
+        'Cache-Control': DOWNLOAD_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        byte_range = parse_range(request.headers.get('range'), size) if _range_applies(request, etag, last_modified) else None
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+
+    headers['Content-Type'] = doc['mime_type'] or 'application/octet-stream'
+    headers['Content-Disposition'] = content_disposition(doc['filename'], inline)
+    status = 200
+    if byte_range:
+        start, end = byte_range
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        headers['Content-Length'] = str(end - start + 1)
+    else:
+        headers['Content-Length'] = str(size)
+
+    if request.method == 'HEAD':
+        return Response(status_code=status, headers=headers)
+
+    upstream = await open_file_stream(doc['stored_filename'], f'bytes={byte_range[0]}-{byte_range[1]}' if byte_range else None)
+    if upstream.status_code not in (200, 206):
+        await upstream.aclose()
+        print(f"❌ Storage returned {upstream.status_code} for {doc['stored_filename']}")
+        return Response(status_code=404 if upstream.status_code in (400, 404) else 502)
+    if upstream.status_code == 200:
+        # Full body (storage may also ignore the range): trust its length
+        status = 200
+        headers.pop('Content-Range', None)
+        headers['Content-Length'] = upstream.headers.get('content-length', str(size))
+    return StreamingResponse(
+        upstream.aiter_bytes(DOWNLOAD_CHUNK_SIZE),
+        status_code=status,
+        headers=headers,
+        background=BackgroundTask(upstream.aclose),
+    )
@@ -0,0 +1,164 @@
+import os
+import time
+import asyncio
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+from database import download_file, save_extraction
+from extractors import can_extract, extract_document, preload_parsers
+
+# Load environment variables
+load_dotenv()
+
+# Post-upload extraction: an asyncio queue feeding a process pool so parsing
+# never runs on the event loop
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXTRACTION_QUEUE_SIZE = int(os.getenv("EXTRACTION_QUEUE_SIZE", "1000"))
+EXTRACTION_RETRIES = int(os.getenv("EXTRACTION_RETRIES", "3"))
+EXTRACTION_RETRY_DELAY = float(os.getenv("EXTRACTION_RETRY_DELAY", "2"))  # seconds, doubled per attempt
+
+_pool = None
+_queue = None
+_workers = []
+_first_started = None
+_last_finished = None
+
+extraction_stats = {
+    'queued': 0,
+    'completed': 0,
+    'failed': 0,
+    'retries': 0,
+    'dropped': 0,
+    'bytes': 0,
+    'busy_seconds': 0.0,
+}
+
+
+class ExtractionError(Exception):
+    """The document itself could not be parsed; retrying would fail the same way"""
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: never fork a process that is running an event loop
+        _pool = ProcessPoolExecutor(
+            max_workers=EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _pool
+
+
+def enqueue_extraction(doc: dict) -> bool:
+    """Queue a saved documents row (id, user_id, filename, stored_filename) for extraction"""
+    if _queue is None or not doc or not can_extract(doc['filename']):
+        return False
+    try:
+        _queue.put_nowait({'id': doc['id'], 'user_id': doc['user_id'], 'filename': doc['filename'], 'stored_filename': doc['stored_filename']})
+    except asyncio.QueueFull:
+        extraction_stats['dropped'] += 1
+        return False
+    extraction_stats['queued'] += 1
+    return True
+
+
+async def _process(job: dict):
+    global _pool, _first_started, _last_finished
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    if _first_started is None:
+        _first_started = started
+    data = await download_file(job['stored_filename'])
+    try:
+        result = await loop.run_in_executor(get_pool(), extract_document, job['filename'], data)
+    except BrokenProcessPool:
+        # A worker process died: the retry gets a fresh pool
+        _pool = None
+        raise
+    except Exception as e:
+        raise ExtractionError(f"{type(e).__name__}: {e}") from e
+    _last_finished = time.perf_counter()
+    extraction_stats['bytes'] += len(data)
+    extraction_stats['busy_seconds'] += _last_finished - started
+    saved = await save_extraction(job['user_id'], job['id'], {
+        **result,
+        'extraction_status': 'done',
+        'extracted_at': datetime.now(timezone.utc).isoformat(),
+    })
+    if not saved:
+        raise RuntimeError('could not save the extraction')
+
+
+async def _fail(job: dict, error: Exception):
+    print(f"❌ Extraction failed for {job['filename']}: {error}")
+    extraction_stats['failed'] += 1
+    await save_extraction(job['user_id'], job['id'], {'extraction_status': 'failed'})
+
+
+async def _worker():
+    """Download and save errors are retried with backoff; a document that
+    does not parse fails at once"""
+    while True:
+        job = await _queue.get()
+        try:
+            for attempt in range(EXTRACTION_RETRIES + 1):
+                try:
+                    await _process(job)
+                    extraction_stats['completed'] += 1
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except ExtractionError as e:
+                    await _fail(job, e)
+                    break
+                except Exception as e:
+                    if attempt == EXTRACTION_RETRIES:
+                        await _fail(job, e)
+                        break
+                    extraction_stats['retries'] += 1
+                    await asyncio.sleep(EXTRACTION_RETRY_DELAY * 2 ** attempt)
+        finally:
+            _queue.task_done()
+
+
+def start_extraction_workers():
+    """Start one queue consumer per pool process (app startup)"""
+    global _queue
+    _queue = asyncio.Queue(maxsize=EXTRACTION_QUEUE_SIZE)
+    _workers.extend(asyncio.create_task(_worker()) for _ in range(EXTRACTION_WORKERS))
+
+
+async def warm_extraction_pool() -> int:
+    """Spawn the pool processes and load the parsers in them ahead of the
+    first upload; returns how many distinct processes were warmed"""
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    pids = await asyncio.gather(*(loop.run_in_executor(pool, preload_parsers) for _ in range(EXTRACTION_WORKERS)))
+    return len(set(pids))
+
+
+async def stop_extraction_workers():
+    global _pool, _queue
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queue = None
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def get_extraction_stats() -> dict:
+    """Throughput counters: docs/sec and MB/sec from the first job to the
+    latest completion (all workers together)"""
+    elapsed = (_last_finished - _first_started) if _last_finished else 0
+    return {
+        **extraction_stats,
+        'workers': EXTRACTION_WORKERS,
+        'pending': _queue.qsize() if _queue else 0,
+        'docs_per_sec': round(extraction_stats['completed'] / elapsed, 3) if elapsed else 0.0,
+        'mb_per_sec': round(extraction_stats['bytes'] / elapsed / (1024 * 1024), 3) if elapsed else 0.0,
+    }
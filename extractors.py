@@ -0,0 +1,111 @@
+# CPU-bound text extraction for PDF, DOCX and XLSX documents. These functions
+# run inside the extraction process pool, so only the standard library is
+# imported here; each parser is imported on first use in the worker process.
+import io
+import os
+from pathlib import Path
+
+# Stored text is capped to keep documents rows reasonable
+MAX_TEXT_CHARS = 1_000_000
+
+
+def _clip(parts) -> str:
+    # Postgres text and jsonb reject NUL, which some PDFs emit
+    text = '\n'.join(p for p in parts if p).replace('\x00', '')
+    return text[:MAX_TEXT_CHARS]
+
+
+def _clean_metadata(values: dict) -> dict:
+    values = {k: str(v).replace('\x00', '') for k, v in values.items() if v is not None}
+    return {k: v for k, v in values.items() if v}
+
+
+def extract_pdf(data: bytes) -> dict:
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    info = reader.metadata or {}
+    return {
+        'extracted_text': _clip(page.extract_text() or '' for page in reader.pages),
+        'page_count': len(reader.pages),
+        'doc_metadata': _clean_metadata({
+            'title': info.get('/Title'),
+            'author': info.get('/Author'),
+            'subject': info.get('/Subject'),
+            'producer': info.get('/Producer'),
+            'created': info.get('/CreationDate'),
+        }),
+    }
+
+
+def extract_docx(data: bytes) -> dict:
+    import docx
+
+    document = docx.Document(io.BytesIO(data))
+    paragraphs = [p.text for p in document.paragraphs]
+    cells = [cell.text for table in document.tables for row in table.rows for cell in row.cells]
+    props = document.core_properties
+    return {
+        'extracted_text': _clip(paragraphs + cells),
+        'doc_metadata': _clean_metadata({
+            'title': props.title,
+            'author': props.author,
+            'subject': props.subject,
+            'created': props.created,
+            'modified': props.modified,
+            'paragraphs': len(paragraphs),
+            'tables': len(document.tables),
+        }),
+    }
+
+
+def extract_xlsx(data: bytes) -> dict:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        parts = []
+        for sheet in workbook.worksheets:
+            parts.append(sheet.title)
+            for row in sheet.iter_rows(values_only=True):
+                line = ' '.join(str(v) for v in row if v is not None)
+                if line:
+                    parts.append(line)
+        props = workbook.properties
+        return {
+            'extracted_text': _clip(parts),
+            'sheet_count': len(workbook.sheetnames),
+            'doc_metadata': _clean_metadata({
+                'title': props.title,
+                'author': props.creator,
+                'created': props.created,
+                'modified': props.modified,
+                'sheets': ', '.join(workbook.sheetnames),
+            }),
+        }
+    finally:
+        workbook.close()
+
+
+EXTRACTORS = {
+    '.pdf': extract_pdf,
+    '.docx': extract_docx,
+    '.xlsx': extract_xlsx,
+}
+
+
+def preload_parsers() -> int:
+    """Import every parser in this worker process (pool warm-up); returns the pid"""
+    import PyPDF2  # noqa: F401
+    import docx  # noqa: F401
+    import openpyxl  # noqa: F401
+    return os.getpid()
+
+
+def can_extract(filename: str) -> bool:
+    return Path(filename).suffix.lower() in EXTRACTORS
+
+
+def extract_document(filename: str, data: bytes) -> dict:
+    """Extract text, page/sheet counts and metadata; runs in a worker process"""
+    return EXTRACTORS[Path(filename).suffix.lower()](data)
@@ -0,0 +1,90 @@
+import os
+import gzip
+import hashlib
+from types import SimpleNamespace
+from fasthtml.common import Title, Link, respond, to_xml
+from starlette.responses import Response
+from compression import accepted_encoding, brotli
+
+# Static pages (no per-user content) are rendered once per app version and
+# served from memory with pre-compressed variants
+APP_VERSION = os.getenv("APP_VERSION") or os.getenv("VERCEL_GIT_COMMIT_SHA") or "dev"
+SHELL_CACHE_CONTROL = os.getenv("SHELL_CACHE_CONTROL", "public, max-age=300, stale-while-revalidate=86400")
+
+_pages = {}
+_shells = {}
+_rendered_version = None
+
+
+class Shell:
+    """One rendered page: body bytes and a strong ETag per content-coding
+    (each representation has its own, as in static_files)"""
+
+    __slots__ = ('etags', 'variants')
+
+    def __init__(self, html: str):
+        body = html.encode()
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {None: body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(body, quality=11)
+        self.etags = {coding: f'"{digest}-{coding}"' if coding else f'"{digest}"' for coding in self.variants}
+
+
+def static_shell(path: str):
+    """Register a page builder (no arguments, no user data) served at path"""
+    def register(builder):
+        _pages[path] = builder
+        return builder
+    return register
+
+
+def _render(app, path: str, builder, base_url: str) -> dict:
+    """Full page (as FastHTML renders it) and the HTMX fragment"""
+    content = builder()
+    # Same document FastHTML builds per request, with a fixed canonical URL
+    req = SimpleNamespace(hdrs=app.hdrs, ftrs=app.ftrs, htmlkw=app.htmlkw, bodykw=app.bodykw, body_wrap=app.body_wrap)
+    heads = [Title(app.title), Link(rel='canonical', href=f"{base_url}{path}")]
+    return {
+        False: Shell(to_xml(respond(req, heads, content))),
+        True: Shell(to_xml(content)),
+    }
+
+
+def render_shells(app, base_url: str):
+    """Render every registered page (startup, or first request of a new version)"""
+    global _rendered_version
+    for path, builder in _pages.items():
+        _shells[path] = _render(app, path, builder, base_url)
+    _rendered_version = APP_VERSION
+    print(f"🧱 Rendered {len(_shells)} static pages ({APP_VERSION})")
+
+
+def serve_shell(request, path: str, base_url: str):
+    """Prerendered page with ETag/304 and the best accepted encoding"""
+    if _rendered_version != APP_VERSION or path not in _shells:
+        render_shells(request.app, base_url)
+    fragment = 'hx-request' in request.headers and 'hx-history-restore-request' not in request.headers
+    shell = _shells[path][fragment]
+    coding = accepted_encoding(request.headers.get('accept-encoding'), tuple(c for c in ('br', 'gzip') if c in shell.variants))
+    headers = {
+        'ETag': shell.etags[coding],
+        'Cache-Control': SHELL_CACHE_CONTROL,
+        'Vary': 'Accept-Encoding, HX-Request, HX-History-Restore-Request',
+    }
+    # Only a validator for the representation being served may answer 304
+    if shell.etags[coding] in [tag.strip().removeprefix('W/') for tag in request.headers.get('if-none-match', '').split(',')]:
+        return Response(status_code=304, headers=headers)
+    if coding:
+        headers['Content-Encoding'] = coding
+    return Response(shell.variants[coding], media_type='text/html; charset=utf-8', headers=headers)
+
+
+def get_shell_stats() -> dict:
+    return {
+        'version': _rendered_version,
+        'pages': {
+            path: {encoding or 'identity': len(body) for encoding, body in variants[False].variants.items()}
+            for path, variants in _shells.items()
+        },
+    }
@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import hashlib
+import mimetypes
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from pathlib import Path
+from starlette.responses import Response, FileResponse
+from compression import accepted_encoding
+from downloads import not_modified
+
+# Files under /static are indexed once (content hash, size, precompressed
+# siblings); requests are answered from that index without touching the disk
+# for metadata, and small files straight from memory
+STATIC_ROOT = Path(os.getenv("STATIC_ROOT", Path(__file__).resolve().parent / 'static'))
+STATIC_MEMORY_MAX = int(os.getenv("STATIC_MEMORY_MAX", str(256 * 1024)))  # bytes
+# Re-check files on every request while developing (build_css.py rewrites them)
+STATIC_RELOAD = os.getenv("STATIC_RELOAD", "0" if os.getenv("VERCEL") else "1") == "1"
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+FINGERPRINTED_RE = re.compile(r'\.[0-9a-f]{10}\.[a-z0-9]+$')
+# Siblings written by the build next to the file they compress (app.css.gz)
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+_files = None
+_assets = None
+
+static_stats = {
+    'requests': 0,
+    'not_modified': 0,
+    'precompressed': 0,
+    'from_memory': 0,
+    'missing': 0,
+    'rejected': 0,
+}
+
+
+class _Variant:
+    """One stored representation (identity or a precompressed sibling)"""
+
+    __slots__ = ('path', 'stat', 'etag', 'body')
+
+    def __init__(self, path: Path, etag: str):
+        self.path = path
+        self.stat = path.stat()
+        self.etag = etag
+        self.body = path.read_bytes() if self.stat.st_size <= STATIC_MEMORY_MAX else None
+
+
+class StaticFile:
+    __slots__ = ('content_type', 'cache_control', 'last_modified', 'modified_at', 'variants', 'codings')
+
+    def __init__(self, rel: str, path: Path):
+        digest = _file_digest(path)
+        self.content_type = mimetypes.guess_type(rel)[0] or 'application/octet-stream'
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if FINGERPRINTED_RE.search(rel) else REVALIDATE_CACHE_CONTROL
+        self.variants = {None: _Variant(path, f'"{digest}"')}
+        for coding, suffix in PRECOMPRESSED:
+            sibling = path.with_name(path.name + suffix)
+            if sibling.is_file():
+                self.variants[coding] = _Variant(sibling, f'"{digest}-{coding}"')
+        self.codings = tuple(coding for coding, _ in PRECOMPRESSED if coding in self.variants)
+        self.modified_at = datetime.fromtimestamp(int(self.variants[None].stat.st_mtime), timezone.utc)
+        self.last_modified = format_datetime(self.modified_at, usegmt=True)
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()[:32]
+
+
+def safe_path(filepath: str):
+    """Relative path inside STATIC_ROOT, or None for traversal attempts,
+    hidden files and malformed names"""
+    if not filepath or '\x00' in filepath or '\\' in filepath or filepath.startswith('/'):
+        return None
+    parts = filepath.split('/')
+    if any(part in ('', '.', '..') or part.startswith('.') for part in parts):
+        return None
+    return '/'.join(parts)
+
+
+def build_static_manifest():
+    """Index every file under STATIC_ROOT (startup, or first static request)"""
+    global _files
+    files = {}
+    for directory, dirnames, filenames in os.walk(STATIC_ROOT):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for filename in filenames:
+            path = Path(directory) / filename
+            rel = path.relative_to(STATIC_ROOT).as_posix()
+            if filename.startswith('.') or any(filename.endswith(suffix) and (path.with_suffix('')).is_file() for _, suffix in PRECOMPRESSED):
+                continue
+            files[rel] = StaticFile(rel, path)
+    _files = files
+    precompressed = sum(len(f.codings) for f in files.values())
+    print(f"📦 Indexed {len(files)} static files ({precompressed} precompressed variants)")
+
+
+def _lookup(rel: str):
+    if _files is None:
+        build_static_manifest()
+    entry = _files.get(rel)
+    if not STATIC_RELOAD:
+        return entry
+    path = STATIC_ROOT / rel
+    try:
+        stat = path.stat()
+    except OSError:
+        _files.pop(rel, None)
+        return None
+    if not path.is_file():
+        return None
+    current = entry.variants[None].stat if entry else None
+    if current is None or (current.st_mtime, current.st_size) != (stat.st_mtime, stat.st_size):
+        entry = _files[rel] = StaticFile(rel, path)
+    return entry
+
+
+def serve_static(request, filepath: str):
+    """File from the static index with ETag/304, precompressed variants and
+    immutable caching for fingerprinted names"""
+    static_stats['requests'] += 1
+    rel = safe_path(filepath)
+    if rel is None:
+        static_stats['rejected'] += 1
+        return Response(status_code=404)
+    entry = _lookup(rel)
+    if entry is None:
+        static_stats['missing'] += 1
+        return Response(status_code=404)
+
+    coding = accepted_encoding(request.headers.get('accept-encoding'), entry.codings) if entry.codings else None
+    variant = entry.variants[coding]
+    headers = {
+        'ETag': variant.etag,
+        'Last-Modified': entry.last_modified,
+        'Cache-Control': entry.cache_control,
+    }
+    if entry.codings:
+        headers['Vary'] = 'Accept-Encoding'
+    if not_modified(request, variant.etag, entry.modified_at):
+        static_stats['not_modified'] += 1
+        return Response(status_code=304, headers=headers)
+
+    if coding:
+        headers['Content-Encoding'] = coding
+        static_stats['precompressed'] += 1
+    if variant.body is not None:
+        static_stats['from_memory'] += 1
+        return Response(variant.body, media_type=entry.content_type, headers=headers)
+    # Large files: streamed (or handed to the server's sendfile) with the
+    # indexed stat, so no per-request os.stat
+    return FileResponse(variant.path, media_type=entry.content_type, headers=headers, stat_result=variant.stat)
+
+
+def asset_url(name: str) -> str:
+    """URL of a built asset by its logical name (static/manifest.json)"""
+    global _assets
+    if _assets is None:
+        _assets = json.loads((STATIC_ROOT / 'manifest.json').read_text())
+    return f"/static/{_assets.get(name, name)}"
+
+
+def get_static_stats() -> dict:
+    files = _files or {}
+    return {
+        **static_stats,
+        'files': len(files),
+        'memory_bytes': sum(len(v.body) for f in files.values() for v in f.variants.values() if v.body is not None),
+    }
@@ -0,0 +1,13 @@
+-- Content hash for upload deduplication
+alter table public.documents
+    add column if not exists content_sha256 text;
+
+-- Per-user and global duplicate lookups
+create index if not exists documents_user_content_sha256_idx
+    on public.documents (user_id, content_sha256);
+create index if not exists documents_content_sha256_idx
+    on public.documents (content_sha256);
+
+-- Reference counting on delete: rows still pointing at a stored object
+create index if not exists documents_stored_filename_idx
+    on public.documents (stored_filename);
@@ -0,0 +1,8 @@
+-- Results of the post-upload text extraction pipeline
+alter table public.documents
+    add column if not exists extracted_text text,
+    add column if not exists page_count integer,
+    add column if not exists sheet_count integer,
+    add column if not exists doc_metadata jsonb not null default '{}'::jsonb,
+    add column if not exists extraction_status text,
+    add column if not exists extracted_at timestamptz;
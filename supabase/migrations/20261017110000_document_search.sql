@@ -0,0 +1,60 @@
+-- Accent-insensitive Spanish full-text search over documents
+create extension if not exists unaccent;
+
+do $$
+begin
+    if not exists (select 1 from pg_ts_config where cfgname = 'spanish_unaccent') then
+        create text search configuration public.spanish_unaccent (copy = pg_catalog.spanish);
+        alter text search configuration public.spanish_unaccent
+            alter mapping for hword, hword_part, word with unaccent, spanish_stem;
+    end if;
+end
+$$;
+
+-- Maintained by Postgres on every insert/update (upload, extraction), so the
+-- index never needs a separate refresh. Filenames are split on . _ - first.
+alter table public.documents
+    add column if not exists search_vector tsvector generated always as (
+        setweight(to_tsvector('public.spanish_unaccent', translate(coalesce(filename, ''), '._-', '   ')), 'A') ||
+        setweight(to_tsvector('public.spanish_unaccent', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('public.spanish_unaccent', left(coalesce(extracted_text, ''), 200000)), 'C')
+    ) stored;
+
+create index if not exists documents_search_vector_idx
+    on public.documents using gin (search_vector);
+
+-- Ranked, paginated search for one user. Every word is matched as a prefix
+-- so results update while typing.
+create or replace function public.search_documents(
+    p_user_id uuid,
+    p_query text,
+    p_limit integer default 20,
+    p_offset integer default 0
+)
+returns table (
+    id text,
+    filename text,
+    description text,
+    uploaded_at timestamptz,
+    file_size bigint,
+    mime_type text,
+    rank real
+)
+language sql
+stable
+as $$
+    with q as (
+        select to_tsquery('public.spanish_unaccent', string_agg(term || ':*', ' & ')) as query
+        from regexp_split_to_table(lower(p_query), '[^[:alnum:]]+') as term
+        where term <> ''
+    )
+    select d.id::text, d.filename::text, d.description::text, d.uploaded_at::timestamptz,
+           d.file_size::bigint, d.mime_type::text,
+           ts_rank_cd(d.search_vector, q.query) as rank
+    from public.documents d, q
+    where d.user_id = p_user_id
+      and d.search_vector @@ q.query
+    order by rank desc, d.uploaded_at desc, d.id desc
+    limit least(greatest(p_limit, 1), 500)
+    offset greatest(p_offset, 0)
+$$;
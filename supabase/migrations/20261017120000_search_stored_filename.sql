@@ -0,0 +1,37 @@
+-- Search results also carry stored_filename so result cards can use signed URLs
+drop function if exists public.search_documents(uuid, text, integer, integer);
+
+create function public.search_documents(
+    p_user_id uuid,
+    p_query text,
+    p_limit integer default 20,
+    p_offset integer default 0
+)
+returns table (
+    id text,
+    filename text,
+    description text,
+    uploaded_at timestamptz,
+    file_size bigint,
+    mime_type text,
+    stored_filename text,
+    rank real
+)
+language sql
+stable
+as $$
+    with q as (
+        select to_tsquery('public.spanish_unaccent', string_agg(term || ':*', ' & ')) as query
+        from regexp_split_to_table(lower(p_query), '[^[:alnum:]]+') as term
+        where term <> ''
+    )
+    select d.id::text, d.filename::text, d.description::text, d.uploaded_at::timestamptz,
+           d.file_size::bigint, d.mime_type::text, d.stored_filename::text,
+           ts_rank_cd(d.search_vector, q.query) as rank
+    from public.documents d, q
+    where d.user_id = p_user_id
+      and d.search_vector @@ q.query
+    order by rank desc, d.uploaded_at desc, d.id desc
+    limit least(greatest(p_limit, 1), 500)
+    offset greatest(p_offset, 0)
+$$;
@@ -0,0 +1,6 @@
+-- Cap every object in the documents bucket. Presigned direct-upload URLs
+-- carry no size limit of their own, so storage enforces it per bucket:
+-- 200 MB, the largest resumable upload (RESUMABLE_MAX_FILE_SIZE)
+update storage.buckets
+    set file_size_limit = 209715200
+    where id = 'documents';
@@ -0,0 +1,648 @@
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import mimetypes
+import tempfile
+import unicodedata
+from datetime import datetime
+from pathlib import Path
+from python_multipart.multipart import MultipartParser, parse_options_header
+from cache import TTLCache
+from database import upload_stream, create_upload_url, probe_file, remove_files, move_file, settle_trashed_files, TRASH_PREFIX, put_object, list_files, download_file, open_file_stream
+
+# Allowed file extensions
+ALLOWED_EXTENSIONS = {'.pdf', '.docx', '.doc', '.xlsx', '.xls'}
+
+# Maximum file size (50MB)
+MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB in bytes
+
+# Room for multipart boundaries, part headers and the description field
+MULTIPART_OVERHEAD = 64 * 1024
+MAX_FIELD_SIZE = 16 * 1024
+
+# Chunks buffered between the request body and the storage upload
+UPLOAD_QUEUE_CHUNKS = int(os.getenv("UPLOAD_QUEUE_CHUNKS", "4"))
+
+# Resumable uploads: chunks are kept in the bucket and assembled on finalize
+RESUMABLE_CHUNK_SIZE = int(os.getenv("RESUMABLE_CHUNK_SIZE", str(5 * 1024 * 1024)))
+RESUMABLE_MAX_FILE_SIZE = int(os.getenv("RESUMABLE_MAX_FILE_SIZE", str(200 * 1024 * 1024)))
+UPLOAD_SESSION_PREFIX = os.getenv("UPLOAD_SESSION_PREFIX", "_resumable")  # storage folder
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 60 * 60)))  # idle seconds
+UPLOAD_SWEEP_INTERVAL = int(os.getenv("UPLOAD_SWEEP_INTERVAL", "600"))  # seconds
+
+# Direct uploads land under DIRECT_UPLOAD_PREFIX/<user_id>/ and finalize moves
+# them into the user's folder; objects never finalized are swept once older
+# than DIRECT_UPLOAD_TTL
+DIRECT_UPLOAD_PREFIX = os.getenv("DIRECT_UPLOAD_PREFIX", "_direct")  # storage folder
+DIRECT_UPLOAD_TTL = int(os.getenv("DIRECT_UPLOAD_TTL", str(60 * 60)))  # seconds
+
+# Batch uploads: files are spooled (RAM up to SPOOL_MEMORY_LIMIT, then disk)
+# and pushed to storage with at most UPLOAD_CONCURRENCY writes in flight
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "20"))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+SPOOL_MEMORY_LIMIT = 1024 * 1024
+
+# Direct-to-storage uploads are checked on finalize against the leading bytes
+# every allowed format starts with (PDF, ZIP-based OOXML, OLE2 legacy Office)
+FILE_SIGNATURES = {
+    '.pdf': b'%PDF-',
+    '.docx': b'PK\x03\x04',
+    '.xlsx': b'PK\x03\x04',
+    '.doc': b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',
+    '.xls': b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',
+}
+
+
+class UploadRejected(Exception):
+    """Upload refused; reason is the dashboard error code (?error=...)"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def is_allowed_file(filename: str) -> bool:
+    return Path(filename).suffix.lower() in ALLOWED_EXTENSIONS
+
+
+def sanitize_filename(filename: str) -> str:
+    """ASCII-only storage name: remove special characters and normalize"""
+    # Normalize unicode characters (ñ -> n, á -> a, etc.)
+    normalized = unicodedata.normalize('NFKD', filename)
+    ascii_name = normalized.encode('ASCII', 'ignore').decode('ASCII')
+
+    # Keep only alphanumeric, dots, hyphens, and underscores
+    clean_name = re.sub(r'[^\w.-]', '_', ascii_name)
+
+    # Replace multiple underscores with single one
+    clean_name = re.sub(r'_{2,}', '_', clean_name)
+
+    # Remove leading/trailing underscores
+    return clean_name.strip('_')
+
+
+def storage_path(user_id: str, filename: str) -> str:
+    """Unique object path under the user's folder"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    return f"{user_id}/{timestamp}_{sanitize_filename(filename)}"
+
+
+async def iter_multipart(request):
+    """Parse a multipart/form-data body incrementally.
+
+    Yields ('field', name, value), ('file', name, filename, content_type),
+    ('data', chunk) and ('file_end',) events; file bytes are never accumulated.
+    """
+    content_type, params = parse_options_header(request.headers.get('content-type', ''))
+    boundary = params.get(b'boundary')
+    if content_type != b'multipart/form-data' or not boundary:
+        raise UploadRejected('no_file')
+
+    events = []
+    part = {}
+
+    def on_part_begin():
+        part.clear()
+        part.update(headers={}, header_field=b'', header_value=b'')
+
+    def on_header_field(data, start, end):
+        part['header_field'] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part['header_value'] += data[start:end]
+
+    def on_header_end():
+        part['headers'][part['header_field'].lower()] = part['header_value']
+        part['header_field'] = part['header_value'] = b''
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part['headers'].get(b'content-disposition', b''))
+        part['name'] = disposition.get(b'name', b'').decode('utf-8', 'replace')
+        filename = disposition.get(b'filename')
+        part['is_file'] = filename is not None
+        if part['is_file']:
+            content_type = part['headers'].get(b'content-type', b'').decode('latin-1') or None
+            events.append(('file', part['name'], filename.decode('utf-8', 'replace'), content_type))
+        else:
+            part['value'] = bytearray()
+
+    def on_part_data(data, start, end):
+        if part['is_file']:
+            events.append(('data', bytes(data[start:end])))
+        else:
+            part['value'] += data[start:end]
+            if len(part['value']) > MAX_FIELD_SIZE:
+                raise UploadRejected('upload_failed')
+
+    def on_part_end():
+        if part['is_file']:
+            events.append(('file_end',))
+        else:
+            events.append(('field', part['name'], part['value'].decode('utf-8', 'replace')))
+
+    parser = MultipartParser(boundary, {
+        'on_part_begin': on_part_begin,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end,
+    })
+    async for chunk in request.stream():
+        parser.write(chunk)
+        for event in events:
+            yield event
+        events.clear()
+    parser.finalize()
+    for event in events:
+        yield event
+
+
+async def _put(queue: asyncio.Queue, chunk, upload_task: asyncio.Task):
+    """Queue a chunk for the uploader, surfacing its error instead of blocking forever"""
+    if not queue.full():
+        queue.put_nowait(chunk)
+        return
+    put = asyncio.ensure_future(queue.put(chunk))
+    await asyncio.wait({put, upload_task}, return_when=asyncio.FIRST_COMPLETED)
+    if not put.done():
+        put.cancel()
+        upload_task.result()
+
+
+async def stream_upload(request, user_id: str, access_token: str, max_size: int = MAX_FILE_SIZE):
+    """Stream the 'file' part of a multipart request straight to storage.
+
+    The request is rejected from Content-Length before reading when possible,
+    and aborted as soon as the running size passes max_size. Memory use is
+    bounded by UPLOAD_QUEUE_CHUNKS request chunks, not by the file size.
+    Returns the stored file's metadata plus the other form fields; raises
+    UploadRejected with a dashboard error code.
+    """
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > max_size + MULTIPART_OVERHEAD:
+        raise UploadRejected('file_too_large')
+
+    queue = asyncio.Queue(maxsize=UPLOAD_QUEUE_CHUNKS)
+    upload_task = None
+    upload = None
+    receiving = False
+    fields = {}
+
+    async def chunks():
+        while (chunk := await queue.get()) is not None:
+            yield chunk
+
+    try:
+        async for event in iter_multipart(request):
+            kind = event[0]
+            if kind == 'field':
+                fields[event[1]] = event[2]
+            elif kind == 'file':
+                _, name, filename, content_type = event
+                receiving = name == 'file' and upload is None and bool(filename)
+                if not receiving:
+                    continue
+                if not is_allowed_file(filename):
+                    raise UploadRejected('invalid_file')
+                upload = {
+                    'filename': filename,
+                    'stored_filename': storage_path(user_id, filename),
+                    'mime_type': content_type or 'application/octet-stream',
+                    'file_size': 0,
+                }
+                digest = hashlib.sha256()
+            elif kind == 'data' and receiving:
+                chunk = event[1]
+                upload['file_size'] += len(chunk)
+                if upload['file_size'] > max_size:
+                    print(f"❌ File too large: over {max_size} bytes")
+                    raise UploadRejected('file_too_large')
+                digest.update(chunk)
+                if upload_task is None:
+                    # Start the storage request lazily so empty files never reach it
+                    upload_task = asyncio.create_task(upload_stream(
+                        access_token, upload['stored_filename'], chunks(), upload['mime_type']
+                    ))
+                await _put(queue, chunk, upload_task)
+            elif kind == 'file_end' and receiving:
+                receiving = False
+                if upload_task is not None:
+                    await _put(queue, None, upload_task)
+
+        if upload is None:
+            raise UploadRejected('no_file')
+        if upload_task is None:
+            print(f"❌ File is empty")
+            raise UploadRejected('empty_file')
+        await upload_task
+    except BaseException:
+        if upload_task is not None and not upload_task.done():
+            # Dropping the request mid-body leaves no object behind in storage
+            upload_task.cancel()
+            await asyncio.gather(upload_task, return_exceptions=True)
+        raise
+
+    return {**upload, 'content_sha256': digest.hexdigest(), 'fields': fields}
+
+
+async def _read_file(f, read_size: int = 1024 * 1024):
+    f.seek(0)
+    while data := await asyncio.to_thread(f.read, read_size):
+        yield data
+
+
+async def stream_batch_upload(request, user_id: str, access_token: str,
+                              max_size: int = MAX_FILE_SIZE, max_files: int = BATCH_MAX_FILES):
+    """Receive every file part of a multipart request and upload them in parallel.
+
+    Each file is validated on its own and starts uploading as soon as it has
+    been received, while the rest of the body is still arriving. Returns
+    (results, fields): one dict per file part in request order, with 'status'
+    'ok' or a dashboard error code, so one bad file never fails the others.
+    """
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > max_files * (max_size + MULTIPART_OVERHEAD):
+        raise UploadRejected('file_too_large')
+
+    semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+    results = []
+    tasks = []
+    fields = {}
+    current = None
+
+    async def push(result, spool):
+        try:
+            async with semaphore:
+                await upload_stream(access_token, result['stored_filename'], _read_file(spool), result['mime_type'])
+            result['status'] = 'ok'
+        except Exception as e:
+            print(f"❌ Error uploading {result['filename']}: {e}")
+            result['status'] = 'upload_failed'
+        finally:
+            spool.close()
+
+    try:
+        async for event in iter_multipart(request):
+            kind = event[0]
+            if kind == 'field':
+                fields[event[1]] = event[2]
+            elif kind == 'file':
+                _, name, filename, content_type = event
+                if name not in ('file', 'files') or not filename:
+                    continue
+                current = {
+                    'filename': filename,
+                    'mime_type': content_type or 'application/octet-stream',
+                    'file_size': 0,
+                    'status': None,
+                }
+                results.append(current)
+                if len(results) > max_files:
+                    current['status'] = 'too_many_files'
+                elif not is_allowed_file(filename):
+                    current['status'] = 'invalid_file'
+                else:
+                    current['stored_filename'] = storage_path(user_id, filename)
+                    current['spool'] = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_LIMIT)
+                    current['digest'] = hashlib.sha256()
+            elif kind == 'data' and current and current['status'] is None:
+                current['file_size'] += len(event[1])
+                if current['file_size'] > max_size:
+                    current['status'] = 'file_too_large'
+                    current.pop('spool').close()
+                else:
+                    current['digest'].update(event[1])
+                    await asyncio.to_thread(current['spool'].write, event[1])
+            elif kind == 'file_end' and current:
+                if current['status'] is None:
+                    spool = current.pop('spool')
+                    current['content_sha256'] = current.pop('digest').hexdigest()
+                    if current['file_size'] == 0:
+                        current['status'] = 'empty_file'
+                        spool.close()
+                    else:
+                        tasks.append(asyncio.create_task(push(current, spool)))
+                current = None
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if current and 'spool' in current:
+            current['spool'].close()
+        raise
+
+    if not results:
+        raise UploadRejected('no_file')
+    return results, fields
+
+
+# Resumable uploads
+#
+# A session lives in the storage bucket, not on local disk: serverless
+# instances each have their own small /tmp, and consecutive chunk requests
+# rarely reach the same one. Under UPLOAD_SESSION_PREFIX/<id>/ are
+# session.json and one object per received chunk, so chunks may arrive in
+# any order or be re-sent (upsert) and progress is one folder listing.
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+_last_sweep = 0.0
+# Session metadata never changes after creation; spares a download per chunk
+_sessions = TTLCache(maxsize=1024, ttl=300)
+
+
+def _session_prefix(upload_id: str) -> str:
+    return f"{UPLOAD_SESSION_PREFIX}/{upload_id}"
+
+
+def _chunk_name(index: int) -> str:
+    return f'{index:06d}.chunk'
+
+
+def _chunk_count(size: int, chunk_size: int) -> int:
+    return max(1, -(-size // chunk_size))
+
+
+def _chunk_length(session: dict, index: int) -> int:
+    """Exact byte length expected for chunk index"""
+    if index < session['chunks'] - 1:
+        return session['chunk_size']
+    return session['size'] - session['chunk_size'] * (session['chunks'] - 1)
+
+
+async def _received_chunks(session: dict) -> set:
+    """Indexes of the stored chunks that have their full length"""
+    received = set()
+    for item in await list_files(_session_prefix(session['id'])):
+        name = item.get('name', '')
+        if not name.endswith('.chunk') or not name[:-6].isdigit():
+            continue
+        index = int(name[:-6])
+        if index < session['chunks'] and (item.get('metadata') or {}).get('size') == _chunk_length(session, index):
+            received.add(index)
+    return received
+
+
+async def create_upload_session(user_id: str, filename: str, size: int, mime_type: str = None,
+                                description: str = '') -> dict:
+    """Open a resumable upload; raises UploadRejected for bad names or sizes"""
+    if not filename or not is_allowed_file(filename):
+        raise UploadRejected('invalid_file')
+    if size <= 0:
+        raise UploadRejected('empty_file')
+    if size > RESUMABLE_MAX_FILE_SIZE:
+        raise UploadRejected('file_too_large')
+
+    session = {
+        'id': uuid.uuid4().hex,
+        'user_id': user_id,
+        'filename': filename,
+        'mime_type': mime_type or 'application/octet-stream',
+        'description': description or '',
+        'size': size,
+        'chunk_size': RESUMABLE_CHUNK_SIZE,
+        'chunks': _chunk_count(size, RESUMABLE_CHUNK_SIZE),
+        'created_at': time.time(),
+    }
+    await put_object(f"{_session_prefix(session['id'])}/session.json", json.dumps(session).encode(), 'application/json')
+    _sessions.set(session['id'], session)
+    return session
+
+
+async def get_upload_session(user_id: str, upload_id: str):
+    """Session metadata if it exists and belongs to user_id"""
+    if not upload_id or not _UPLOAD_ID.match(upload_id):
+        return None
+    session = _sessions.get(upload_id)
+    if session is None:
+        try:
+            session = json.loads(await download_file(f"{_session_prefix(upload_id)}/session.json"))
+        except Exception:
+            return None
+        _sessions.set(upload_id, session)
+    return session if session['user_id'] == user_id else None
+
+
+async def upload_progress(session: dict) -> dict:
+    received = await _received_chunks(session)
+    return {
+        'id': session['id'],
+        'size': session['size'],
+        'chunk_size': session['chunk_size'],
+        'chunks': session['chunks'],
+        'received': sorted(received),
+        'bytes_received': sum(_chunk_length(session, i) for i in received),
+        'missing': [i for i in range(session['chunks']) if i not in received],
+    }
+
+
+async def write_chunk(session: dict, index: int, offset: int, body) -> None:
+    """Stream one chunk from an async byte iterator to storage. offset must
+    match index, and the body must be exactly the chunk's length."""
+    if not 0 <= index < session['chunks'] or offset != index * session['chunk_size']:
+        raise UploadRejected('invalid_chunk')
+    expected = _chunk_length(session, index)
+    path = f"{_session_prefix(session['id'])}/{_chunk_name(index)}"
+    written = 0
+
+    async def measured():
+        nonlocal written
+        async for data in body:
+            written += len(data)
+            if written > expected:
+                raise UploadRejected('file_too_large')
+            yield data
+
+    await put_object(path, measured())
+    if written != expected:
+        # A short chunk would never count as received; drop it right away
+        await remove_files([path])
+        raise UploadRejected('invalid_chunk')
+
+
+async def _read_chunks(session: dict, digest):
+    prefix = _session_prefix(session['id'])
+    for index in range(session['chunks']):
+        response = await open_file_stream(f"{prefix}/{_chunk_name(index)}")
+        try:
+            response.raise_for_status()
+            async for data in response.aiter_bytes():
+                digest.update(data)
+                yield data
+        finally:
+            await response.aclose()
+
+
+async def finalize_upload_session(session: dict, access_token: str) -> dict:
+    """Stream the stored chunks, in order, into the final object and remove
+    the session. Returns the same metadata as stream_upload."""
+    if len(await _received_chunks(session)) != session['chunks']:
+        raise UploadRejected('incomplete_upload')
+    stored_filename = storage_path(session['user_id'], session['filename'])
+    digest = hashlib.sha256()
+    await upload_stream(access_token, stored_filename, _read_chunks(session, digest), session['mime_type'])
+    await discard_upload_session(session)
+    return {
+        'filename': session['filename'],
+        'stored_filename': stored_filename,
+        'mime_type': session['mime_type'],
+        'file_size': session['size'],
+        'content_sha256': digest.hexdigest(),
+        'fields': {'description': session['description']},
+    }
+
+
+async def create_direct_upload(user_id: str, filename: str, size: int) -> dict:
+    """Presign a staging path so the browser uploads the file itself; the
+    declared size is only a first check, finalize measures the real object"""
+    if not filename or not is_allowed_file(filename):
+        raise UploadRejected('invalid_file')
+    if size <= 0:
+        raise UploadRejected('empty_file')
+    if size > MAX_FILE_SIZE:
+        raise UploadRejected('file_too_large')
+
+    stored_filename = f"{DIRECT_UPLOAD_PREFIX}/{storage_path(user_id, filename)}"
+    signed = await create_upload_url(stored_filename)
+    return {
+        'stored_filename': stored_filename,
+        'upload_url': signed['signed_url'],
+        'token': signed['token'],
+    }
+
+
+async def verify_direct_upload(user_id: str, stored_filename: str, filename: str,
+                               description: str = '') -> dict:
+    """Check an object uploaded through a presigned URL (owner, size, file
+    signature) and move it from staging into the user's folder; rejected
+    objects are deleted. Returns stream_upload's metadata."""
+    extension = Path(filename or '').suffix.lower()
+    staging = f"{DIRECT_UPLOAD_PREFIX}/{user_id}/"
+    if (not stored_filename.startswith(staging) or '/' in stored_filename[len(staging):] or '..' in stored_filename
+            or not is_allowed_file(filename) or Path(stored_filename).suffix.lower() != extension):
+        raise UploadRejected('invalid_file')
+
+    probe = await probe_file(stored_filename)
+    if probe is None:
+        raise UploadRejected('not_found')
+    head, size, content_type = probe
+    reason = None
+    if size == 0:
+        reason = 'empty_file'
+    elif size > MAX_FILE_SIZE:
+        reason = 'file_too_large'
+    elif not head.startswith(FILE_SIGNATURES[extension]):
+        reason = 'invalid_file'
+    if reason:
+        await remove_files([stored_filename])
+        raise UploadRejected(reason)
+
+    final_filename = stored_filename[len(DIRECT_UPLOAD_PREFIX) + 1:]
+    await move_file(stored_filename, final_filename)
+    return {
+        'filename': filename,
+        'stored_filename': final_filename,
+        'mime_type': content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        'file_size': size,
+        'fields': {'description': description or ''},
+    }
+
+
+async def discard_upload_session(session: dict):
+    prefix = _session_prefix(session['id'])
+    _sessions.pop(session['id'])
+    await remove_files([f"{prefix}/session.json"] + [f"{prefix}/{_chunk_name(i)}" for i in range(session['chunks'])])
+
+
+def _last_activity(items: list) -> float:
+    stamps = [item.get('updated_at') or item.get('created_at') for item in items]
+    return max((datetime.fromisoformat(s.replace('Z', '+00:00')).timestamp() for s in stamps if s), default=0.0)
+
+
+async def sweep_upload_sessions(now: float = None) -> int:
+    """Delete sessions whose newest object is older than UPLOAD_SESSION_TTL;
+    returns how many"""
+    global _last_sweep
+    now = now or time.time()
+    _last_sweep = now
+    removed = 0
+    try:
+        for folder in await list_files(UPLOAD_SESSION_PREFIX):
+            if folder.get('id') is not None or not _UPLOAD_ID.match(folder.get('name', '')):
+                continue
+            prefix = _session_prefix(folder['name'])
+            items = await list_files(prefix)
+            if now - _last_activity(items) > UPLOAD_SESSION_TTL:
+                await remove_files([f"{prefix}/{item['name']}" for item in items])
+                _sessions.pop(folder['name'])
+                removed += 1
+    except Exception as e:
+        print(f"⚠️ Error sweeping upload sessions: {e}")
+    if removed:
+        print(f"🧹 Removed {removed} abandoned upload session(s)")
+    await sweep_direct_uploads(now)
+    await sweep_trash(now)
+    return removed
+
+
+async def sweep_direct_uploads(now: float = None) -> int:
+    """Delete staged direct uploads older than DIRECT_UPLOAD_TTL that were
+    never finalized; returns how many"""
+    now = now or time.time()
+    removed = 0
+    try:
+        for folder in await list_files(DIRECT_UPLOAD_PREFIX):
+            if folder.get('id') is not None:
+                continue
+            prefix = f"{DIRECT_UPLOAD_PREFIX}/{folder['name']}"
+            stale = [
+                f"{prefix}/{item['name']}" for item in await list_files(prefix)
+                if item.get('id') is not None and now - _last_activity([item]) > DIRECT_UPLOAD_TTL
+            ]
+            if stale:
+                await remove_files(stale)
+                removed += len(stale)
+    except Exception as e:
+        print(f"⚠️ Error sweeping direct uploads: {e}")
+    if removed:
+        print(f"🧹 Removed {removed} unfinalized direct upload(s)")
+    return removed
+
+
+async def sweep_trash(now: float = None) -> int:
+    """Settle objects a delete left in the trash (interrupted between moving
+    and deleting them); returns how many were deleted"""
+    now = now or time.time()
+    removed = []
+    try:
+        for folder in await list_files(TRASH_PREFIX):
+            if folder.get('id') is not None:
+                continue
+            removed += await settle_trashed_files([
+                f"{folder['name']}/{item['name']}" for item in await list_files(f"{TRASH_PREFIX}/{folder['name']}")
+                if item.get('id') is not None and now - _last_activity([item]) > UPLOAD_SWEEP_INTERVAL
+            ])
+    except Exception as e:
+        print(f"⚠️ Error sweeping the trash: {e}")
+    if removed:
+        print(f"🧹 Removed {len(removed)} trashed file(s)")
+    return len(removed)
+
+
+async def maybe_sweep_upload_sessions():
+    """Sweep at most once per UPLOAD_SWEEP_INTERVAL (serverless has no idle loop)"""
+    if time.time() - _last_sweep > UPLOAD_SWEEP_INTERVAL:
+        await sweep_upload_sessions()
+
+
+async def run_upload_sweeper():
+    """Background loop started with the app"""
+    while True:
+        await sweep_upload_sessions()
+        await asyncio.sleep(UPLOAD_SWEEP_INTERVAL)
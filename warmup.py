@@ -0,0 +1,134 @@
+import os
+import time
+import asyncio
+import inspect
+from dotenv import load_dotenv
+from auth import refresh_jwks
+from database import warm_connections
+from extraction import warm_extraction_pool
+from shells import render_shells
+from static_files import build_static_manifest
+
+# Load environment variables
+load_dotenv()
+
+# Startup warm-up: pay connection setup, worker spawning and page rendering
+# before traffic arrives; /ready answers 503 until it has finished
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "2"))  # per Supabase endpoint
+WARMUP_THREADS = int(os.getenv("WARMUP_THREADS", "4"))  # default executor (file spooling)
+WARMUP_EXTRACTION = os.getenv("WARMUP_EXTRACTION", "1") == "1"
+WARMUP_SHELLS = os.getenv("WARMUP_SHELLS", "1") == "1"
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "15"))  # seconds startup waits for it
+# Steps that must succeed before /ready answers 200; while one has failed the
+# instance is degraded and /ready re-runs it at most every WARMUP_RETRY_INTERVAL
+WARMUP_REQUIRED = tuple(name.strip() for name in os.getenv("WARMUP_REQUIRED", "connections").split(',') if name.strip())
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "10"))  # seconds
+
+warmup_state = {
+    'status': 'pending',  # pending -> warming -> ready | degraded
+    'steps': {},
+    'failed': [],
+    'ms': None,
+}
+
+_work = {}
+_last_attempt = 0.0
+
+
+async def _step(name: str, work):
+    """Run one warm-up step, recording its duration and result; failures are
+    logged and never abort the rest"""
+    _work[name] = work
+    start = time.perf_counter()
+    try:
+        result = work()
+        if inspect.isawaitable(result):
+            result = await result
+        error = None
+    except Exception as e:
+        result, error = None, f"{type(e).__name__}: {e}"
+        print(f"⚠️ Warm-up step {name} failed: {error}")
+    warmup_state['steps'][name] = {
+        'ms': round((time.perf_counter() - start) * 1000, 1),
+        'result': result,
+        'error': error,
+    }
+
+
+async def _warm_threads():
+    # Concurrent blocking calls make the default executor start its threads
+    await asyncio.gather(*(asyncio.to_thread(time.sleep, 0.01) for _ in range(WARMUP_THREADS)))
+    return WARMUP_THREADS
+
+
+def _settle():
+    global _last_attempt
+    _last_attempt = time.monotonic()
+    warmup_state['failed'] = [name for name in WARMUP_REQUIRED if (warmup_state['steps'].get(name) or {}).get('error')]
+    warmup_state['status'] = 'degraded' if warmup_state['failed'] else 'ready'
+
+
+async def warm_up(app, base_url: str):
+    """Every enabled step; CPU-only work first, then the network and the
+    executors concurrently"""
+    warmup_state['status'] = 'warming'
+    start = time.perf_counter()
+    if WARMUP_SHELLS:
+        await _step('shells', lambda: render_shells(app, base_url))
+    await _step('static', build_static_manifest)
+    steps = [
+        _step('connections', lambda: warm_connections(WARMUP_CONNECTIONS)),
+        _step('jwks', refresh_jwks),
+        _step('threads', _warm_threads),
+    ]
+    if WARMUP_EXTRACTION:
+        steps.append(_step('extraction', warm_extraction_pool))
+    await asyncio.gather(*steps)
+    warmup_state['ms'] = round((time.perf_counter() - start) * 1000, 1)
+    _settle()
+    steps_ms = ', '.join(f"{name} {step['ms']:.0f}" for name, step in warmup_state['steps'].items())
+    print(f"🔥 Warm-up done in {warmup_state['ms']:.0f} ms ({steps_ms})")
+    if warmup_state['failed']:
+        print(f"⚠️ Not ready, required warm-up steps failed: {', '.join(warmup_state['failed'])}")
+
+
+async def retry_warmup():
+    """Re-run the failed required steps of a degraded instance (from /ready),
+    at most once per WARMUP_RETRY_INTERVAL"""
+    global _last_attempt
+    if warmup_state['status'] != 'degraded' or time.monotonic() - _last_attempt < WARMUP_RETRY_INTERVAL:
+        return
+    _last_attempt = time.monotonic()
+    failed = warmup_state['failed']
+    await asyncio.gather(*(_step(name, _work[name]) for name in failed))
+    _settle()
+    if not warmup_state['failed']:
+        print(f"✅ Warm-up recovered: {', '.join(failed)}")
+
+
+async def start_warmup(app, base_url: str):
+    """Start the warm-up and wait up to WARMUP_TIMEOUT for it (app startup);
+    a slower warm-up keeps running while /ready reports not ready"""
+    if not WARMUP:
+        warmup_state['status'] = 'ready'
+        return
+    app.state.warmup = asyncio.create_task(warm_up(app, base_url))
+    done, _ = await asyncio.wait({app.state.warmup}, timeout=WARMUP_TIMEOUT)
+    if not done:
+        print(f"⏳ Warm-up still running after {WARMUP_TIMEOUT:.0f}s; serving while it finishes")
+
+
+async def stop_warmup(app):
+    task = getattr(app.state, 'warmup', None)
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+def is_ready() -> bool:
+    return warmup_state['status'] == 'ready'
+
+
+def get_warmup_stats() -> dict:
+    return warmup_state